@@ -12,14 +12,29 @@ import sys
 from pathlib import Path
 from datetime import datetime
 import json
-
-from kokoro import KPipeline
+import hashlib
+import gc
+import sqlite3
+import multiprocessing
+import weakref
+from collections import OrderedDict, deque
 
 # Device will be set lazily to avoid heavy torch import at startup
 device = None
 
-# Pipelines cached per language to avoid reloading for mixed-language text
-pipelines = {}
+# How the Kokoro engine (torch, transformers, G2P) gets imported: 'lazy' on first
+# synthesis, or 'background' on a worker thread as soon as the window is up
+ENGINE_IMPORT = 'background'
+
+# Pipelines cached per language to avoid reloading for mixed-language text. At most
+# MAX_RESIDENT_PIPELINES stay loaded, fewer if process RSS exceeds PIPELINE_RSS_BUDGET_MB
+# (0 = no RSS budget); the least recently used language is evicted first.
+MAX_RESIDENT_PIPELINES = 3
+PIPELINE_RSS_BUDGET_MB = 0
+
+# Opt-in: once the window is up, load the selected voice's pipeline and run a tiny
+# synthesis on a background thread so the first Generate doesn't pay for model loading
+WARMUP_ON_START = False
 
 # Default sample rate used by the models
 SAMPLE_RATE = 24000
@@ -27,6 +42,94 @@ SAMPLE_RATE = 24000
 # Application name (change here to rename the app)
 APP_NAME = 'Local TTS'
 
+# Write each chunk to the output file as soon as it is synthesized (flat memory use,
+# partial output survives a cancel). Set to False to buffer the whole document instead.
+STREAM_TO_DISK = True
+
+# Output formats offered in the GUI: label -> (file extension, soundfile format, subtype).
+# All of them are encoded incrementally as chunks arrive.
+OUTPUT_FORMATS = {
+    'WAV (16-bit PCM)': ('wav', 'WAV', 'PCM_16'),
+    'WAV (32-bit float)': ('wav', 'WAV', 'FLOAT'),
+    'FLAC (lossless)': ('flac', 'FLAC', 'PCM_16'),
+    'OGG Vorbis': ('ogg', 'OGG', 'VORBIS'),
+    'Opus': ('opus', 'OGG', 'OPUS'),
+}
+DEFAULT_OUTPUT_FORMAT = 'WAV (16-bit PCM)'
+
+# Output sample rates offered in the GUI. Anything other than SAMPLE_RATE is
+# resampled chunk by chunk with soxr at RESAMPLE_QUALITY ('QQ', 'LQ', 'MQ', 'HQ', 'VHQ').
+OUTPUT_SAMPLE_RATES = (24000, 48000, 44100, 22050, 16000, 8000)
+RESAMPLE_QUALITY = 'HQ'
+# Rates the Opus encoder accepts
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+# Joining chunks: trim each chunk's leading/trailing silence (10 ms frames quieter than
+# SILENCE_THRESHOLD_DB below the chunk's loudest frame), put PAUSE_MS of silence between
+# chunks and fade every join over CROSSFADE_MS with equal-power curves (overlapping the
+# chunks when PAUSE_MS is 0). Set JOIN_CHUNKS = False for plain concatenation.
+JOIN_CHUNKS = True
+SILENCE_THRESHOLD_DB = -40
+PAUSE_MS = 250
+CROSSFADE_MS = 10
+
+# Where preview audio goes: 'auto' (sounddevice, then aplay, then file + system player),
+# 'sounddevice', 'aplay', 'file' (write PREVIEW_PATH only) or 'null' (discard; headless use)
+PREVIEW_SINK = 'auto'
+PREVIEW_PATH = os.path.join(os.path.expanduser('~'), '.tts_preview.wav')
+
+# Seconds of audio the preview ring buffer holds before the producer waits for playback
+PREVIEW_BUFFER_SECONDS = 30
+
+# Persistent cache of synthesized chunks, evicted least-recently-used first (0 disables it)
+CHUNK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.tts_cache', 'chunks')
+CHUNK_CACHE_MAX_MB = 512
+
+# Grapheme-to-phoneme memoization per sentence: in-memory LRU entries (0 disables it) backed
+# by an optional SQLite store shared across runs (None keeps it in memory only)
+G2P_CACHE_ENTRIES = 50000
+G2P_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.tts_cache', 'g2p.sqlite')
+
+# Generation history: append-only SQLite log of every finished job (the old .tts_history.json
+# is imported on first use), shown in the sidebar HISTORY_PAGE_SIZE entries at a time
+HISTORY_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.tts_history.sqlite')
+HISTORY_PAGE_SIZE = 50
+
+# Chunking strategy: 'sentence' packs whole sentences up to CHUNK_TOKEN_BUDGET estimated
+# phoneme tokens (Kokoro's hard limit is 510), 'words' is the original fixed 50-word
+# splitter, kept unchanged (no script segmentation) for comparisons
+CHUNKER = 'sentence'
+CHUNK_TOKEN_BUDGET = 250
+
+# Editor statistics: recount this long after the last edit (off the UI thread), and the
+# speaking rate used to predict audio length (estimated phoneme tokens per second at 1.0x)
+EDITOR_STATS_DELAY_MS = 300
+SPEECH_TOKENS_PER_SECOND = 14
+
+# Parallel synthesis: worker processes for Generate (0 = synthesize on the worker thread),
+# and torch intra-op threads per worker process
+PARALLEL_WORKERS = 0
+TORCH_THREADS_PER_WORKER = 1
+
+# Run chunks through overlapping stages (front-end: language routing + G2P; inference;
+# output) connected by queues of STAGE_QUEUE_SIZE items, instead of one after another
+PIPELINED_STAGES = True
+STAGE_QUEUE_SIZE = 4
+
+# Consecutive chunks with the same voice and pipeline handled as one group: one pool task, one
+# G2P cache pass, one KPipeline call. This only groups work per task; it is not model batching
+# (Kokoro still runs one utterance per forward pass), so it saves overhead, not inference time
+SYNTH_BATCH_SIZE = 4
+
+# Per-stage timing of the synthesis hot path (language detection, pipeline lookup/load,
+# G2P, inference, concatenation, encoding...). Every finished job is appended to
+# METRICS_JSONL_PATH and the running totals are rewritten to METRICS_PROM_PATH in
+# Prometheus text format (e.g. for node_exporter's textfile collector); None skips a file.
+# With STAGE_METRICS = False the hot-path functions are not wrapped at all.
+STAGE_METRICS = True
+METRICS_JSONL_PATH = os.path.join(os.path.expanduser('~'), '.tts_cache', 'metrics.jsonl')
+METRICS_PROM_PATH = os.path.join(os.path.expanduser('~'), '.tts_cache', 'metrics.prom')
+
 # Available voices (derived from provided model files)
 VOICE_LIST = [
     'af_alloy',
@@ -164,6 +267,35 @@ DEFAULT_VOICE_BY_LANG = {
     'fi': 'ff_siwis'
 }
 
+# Map voice prefixes to supported languages
+VOICE_LANG_MAP = {
+    'af_': ['a', 'en'],  # American Female - English
+    'am_': ['a', 'en'],  # American Male - English
+    'bf_': ['a', 'en'],  # British Female - English
+    'bm_': ['a', 'en'],  # British Male - English
+    'ef_': ['a', 'en'],  # European Female - English
+    'em_': ['a', 'en'],  # European Male - English
+    'ff_': ['fi'],       # Finnish Female
+    'hf_': ['hi'],       # Hindi Female
+    'hm_': ['hi'],       # Hindi Male
+    'if_': ['id'],       # Indonesian Female
+    'im_': ['id'],       # Indonesian Male
+    'jf_': ['ja'],       # Japanese Female
+    'jm_': ['ja'],       # Japanese Male
+    'pf_': ['pt'],       # Portuguese Female
+    'pm_': ['pt'],       # Portuguese Male
+    'zf_': ['zh'],       # Chinese Female
+}
+
+# Short phrase per pipeline language used to warm up the model and voice pack
+WARMUP_TEXT = {
+    'a': 'Hello.',
+    'hi': 'नमस्ते।',
+    'ja': 'こんにちは。',
+    'zh': '你好。',
+    'pt': 'Olá.',
+}
+
 # Modern design system - Light theme
 COLORS_LIGHT = {
     'primary': '#6366f1',       # Indigo - main actions
@@ -216,6 +348,2302 @@ def get_resource_path(relative_path: str) -> str:
     return str(Path(base_path) / relative_path)
 
 
+class StageMetrics:
+    """Thread-safe running totals of call count and time per hot-path stage.
+
+    Jobs diff a snapshot taken at their start against the totals at their end.
+    Work done in PARALLEL_WORKERS processes is not seen here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}  # stage -> [calls, seconds]
+        self.jobs = 0
+        self.audio_seconds = 0.0
+
+    def add(self, stage, seconds):
+        with self._lock:
+            totals = self._totals.get(stage)
+            if totals is None:
+                self._totals[stage] = [1, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: tuple(totals) for stage, totals in self._totals.items()}
+
+    def since(self, start):
+        """Per-stage {'calls', 'seconds'} accumulated since snapshot start."""
+        report = {}
+        for stage, (calls, seconds) in self.snapshot().items():
+            calls -= start.get(stage, (0, 0.0))[0]
+            seconds -= start.get(stage, (0, 0.0))[1]
+            if calls:
+                report[stage] = {'calls': calls, 'seconds': round(seconds, 6)}
+        return report
+
+    def record_job(self, record):
+        """Count a finished job and export it: one JSON line, and refreshed Prometheus totals."""
+        with self._lock:
+            self.jobs += 1
+            self.audio_seconds += record.get('audio_seconds', 0.0)
+        try:
+            if METRICS_JSONL_PATH:
+                os.makedirs(os.path.dirname(METRICS_JSONL_PATH), exist_ok=True)
+                with open(METRICS_JSONL_PATH, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if METRICS_PROM_PATH:
+                os.makedirs(os.path.dirname(METRICS_PROM_PATH), exist_ok=True)
+                tmp_path = f'{METRICS_PROM_PATH}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(self.prometheus_text())
+                os.replace(tmp_path, METRICS_PROM_PATH)
+        except OSError as e:
+            print(f'Could not write metrics: {e}', file=sys.stderr)
+
+    def prometheus_text(self):
+        totals = self.snapshot()
+        lines = [
+            '# HELP local_tts_stage_seconds_total Time spent in each synthesis stage.',
+            '# TYPE local_tts_stage_seconds_total counter',
+        ]
+        lines += [f'local_tts_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}' for stage, (_, seconds) in sorted(totals.items())]
+        lines += [
+            '# HELP local_tts_stage_calls_total Calls of each synthesis stage.',
+            '# TYPE local_tts_stage_calls_total counter',
+        ]
+        lines += [f'local_tts_stage_calls_total{{stage="{stage}"}} {calls}' for stage, (calls, _) in sorted(totals.items())]
+        lines += [
+            '# HELP local_tts_jobs_total Finished synthesis jobs.',
+            '# TYPE local_tts_jobs_total counter',
+            f'local_tts_jobs_total {self.jobs}',
+            '# HELP local_tts_audio_seconds_total Seconds of audio produced.',
+            '# TYPE local_tts_audio_seconds_total counter',
+            f'local_tts_audio_seconds_total {self.audio_seconds:.3f}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+stage_metrics = StageMetrics() if STAGE_METRICS else None
+
+
+class _StageTimer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        stage_metrics.add(self.stage, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def stage_timer(stage):
+    """Context manager timing a block as stage (a shared no-op when metrics are off)."""
+    return _StageTimer(stage) if stage_metrics is not None else _NO_TIMER
+
+
+def timed(stage):
+    """Decorator timing every call as stage; returns the function untouched when metrics are off."""
+    def decorate(fn):
+        if stage_metrics is None:
+            return fn
+        import functools
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                stage_metrics.add(stage, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def format_stage_timings(report, top=4):
+    """Largest stages of a StageMetrics.since() report, e.g. 'inference 8.1s · g2p 0.9s'."""
+    ranked = sorted(report.items(), key=lambda item: -item[1]['seconds'])[:top]
+    return ' · '.join(f"{stage} {stats['seconds']:.1f}s" for stage, stats in ranked)
+
+
+class StreamingAudioWriter:
+    """Append audio chunks to an output file as they are produced.
+
+    The file is opened on the first write, so a job that yields no audio leaves
+    nothing behind. Compressed formats (format/subtype as in soundfile) are
+    encoded block by block; encode_seconds is the time spent in the encoder.
+    Closing finalizes the header, which keeps a partially written file
+    playable after a cancel or error.
+    """
+
+    def __init__(self, path, samplerate=SAMPLE_RATE, channels=1, format=None, subtype=None):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.format = format
+        self.subtype = subtype
+        self.frames = 0
+        self.encode_seconds = 0.0
+        self._file = None
+
+    def write(self, audio):
+        """Append a block of samples to the file."""
+        audio = np.asarray(audio)
+        if audio.size == 0:
+            return
+        start = time.perf_counter()
+        if self._file is None:
+            self._file = sf.SoundFile(self.path, mode='w', samplerate=self.samplerate, channels=self.channels,
+                                      format=self.format, subtype=self.subtype)
+        self._file.write(audio)
+        elapsed = time.perf_counter() - start
+        self.encode_seconds += elapsed
+        if stage_metrics is not None:
+            stage_metrics.add('encode', elapsed)
+        self.frames += len(audio)
+
+    def close(self):
+        """Finalize the header. Safe to call more than once."""
+        if self._file is not None and not self._file.closed:
+            start = time.perf_counter()
+            self._file.close()
+            self.encode_seconds += time.perf_counter() - start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamResampler:
+    """Resample consecutive audio chunks as one continuous signal.
+
+    soxr's stream resampler keeps its filter state between calls, so chunk
+    boundaries leave no seams and the result matches resampling the whole
+    file at once. Passes audio through untouched when the rates match.
+    """
+
+    def __init__(self, in_rate, out_rate, quality=RESAMPLE_QUALITY):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self._stream = None
+        if in_rate != out_rate:
+            import soxr
+            self._stream = soxr.ResampleStream(in_rate, out_rate, 1, dtype='float32', quality=quality)
+
+    @timed('resample')
+    def process(self, audio):
+        """Resample the next chunk (may return fewer samples while the filter fills)."""
+        if self._stream is None:
+            return audio
+        return self._stream.resample_chunk(np.asarray(audio, dtype=np.float32))
+
+    def flush(self):
+        """Return the samples still held in the filter at the end of the signal."""
+        if self._stream is None:
+            return np.zeros(0, dtype=np.float32)
+        return self._stream.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+
+
+def trim_silence(audio, samplerate=SAMPLE_RATE, threshold_db=SILENCE_THRESHOLD_DB, frame_ms=10, margin_frames=1,
+                 leading=True, trailing=True):
+    """Return a view of audio without its leading and/or trailing silence.
+
+    Works on 10 ms frames: a frame is silent when its energy is more than
+    threshold_db below the loudest frame. margin_frames of silence are kept on
+    each side so soft onsets and releases aren't clipped.
+    """
+    frame = max(1, samplerate * frame_ms // 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return audio
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy = np.einsum('ij,ij->i', frames, frames)
+    peak = energy.max()
+    if peak <= 0:
+        return audio[:0]
+    loud = np.flatnonzero(energy >= peak * 10 ** (threshold_db / 10))
+    start = max(0, loud[0] - margin_frames) * frame if leading else 0
+    end = len(audio) if loud[-1] == n_frames - 1 or not trailing else min(len(audio), (loud[-1] + 1 + margin_frames) * frame)
+    return audio[start:end]
+
+
+class ChunkJoiner:
+    """Stateful post-processor that joins consecutive chunks cleanly.
+
+    Each chunk is trimmed (trim_silence), then separated from the previous one
+    by pause_ms of silence with equal-power fades on both sides of the join,
+    or overlapped with an equal-power crossfade when pause_ms is 0. A join
+    inside a sentence (the previous chunk had ends_sentence=False, e.g. a
+    script switch mid-sentence) is neither trimmed nor paused, only
+    crossfaded. The last crossfade_ms of every chunk is held back until the
+    next one (or flush()) arrives. Tracks its own cost: seconds spent per
+    minute of output audio.
+    """
+
+    def __init__(self, samplerate=SAMPLE_RATE, pause_ms=PAUSE_MS, crossfade_ms=CROSSFADE_MS,
+                 threshold_db=SILENCE_THRESHOLD_DB):
+        self.samplerate = samplerate
+        self.pause = samplerate * pause_ms // 1000
+        self.crossfade = samplerate * crossfade_ms // 1000
+        self.threshold_db = threshold_db
+        self.frames_in = 0
+        self.frames_out = 0
+        self.seconds = 0.0
+        self._tail = None
+        self._mid_sentence = False
+
+    @staticmethod
+    def _fades(n):
+        # Equal power: fade_in**2 + fade_out**2 == 1 everywhere
+        phase = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+        return np.sin(phase), np.cos(phase)
+
+    @timed('join')
+    def process(self, audio, ends_sentence=True):
+        """Take the next chunk; return the audio that is ready to be written.
+
+        ends_sentence=False means the next chunk continues this one's sentence.
+        """
+        start = time.perf_counter()
+        audio = np.asarray(audio, dtype=np.float32)
+        self.frames_in += len(audio)
+        mid_sentence, self._mid_sentence = self._mid_sentence, not ends_sentence
+        audio = trim_silence(audio, self.samplerate, self.threshold_db, leading=not mid_sentence, trailing=ends_sentence)
+        if audio.size == 0:
+            self.seconds += time.perf_counter() - start
+            return audio
+
+        n = min(self.crossfade, len(audio) // 2)
+        parts = []
+        if self._tail is None:
+            fade_in, _ = self._fades(n)
+            parts.append(audio[:n] * fade_in)
+        elif self.pause and not mid_sentence:
+            fade_in, fade_out = self._fades(len(self._tail))
+            parts.append(self._tail * fade_out)
+            parts.append(np.zeros(self.pause, dtype=np.float32))
+            fade_in, _ = self._fades(n)
+            parts.append(audio[:n] * fade_in)
+        else:
+            n = min(n, len(self._tail))
+            fade_in, fade_out = self._fades(n)
+            parts.append(self._tail[:len(self._tail) - n])
+            parts.append(self._tail[len(self._tail) - n:] * fade_out + audio[:n] * fade_in)
+        hold = min(self.crossfade, len(audio) - n)
+        parts.append(audio[n:len(audio) - hold])
+        self._tail = audio[len(audio) - hold:]
+
+        out = np.concatenate(parts)
+        self.frames_out += len(out)
+        self.seconds += time.perf_counter() - start
+        return out
+
+    def flush(self):
+        """Fade out and return the held-back end of the last chunk."""
+        if self._tail is None or self._tail.size == 0:
+            return np.zeros(0, dtype=np.float32)
+        _, fade_out = self._fades(len(self._tail))
+        out = self._tail * fade_out
+        self._tail = None
+        self._mid_sentence = False
+        self.frames_out += len(out)
+        return out
+
+    def summary(self):
+        """e.g. 'trimmed 4.2s of silence, joins 0.02s/min'."""
+        trimmed = (self.frames_in - self.frames_out) / self.samplerate
+        minutes = self.frames_out / self.samplerate / 60
+        cost = f', joins {self.seconds / minutes:.3f}s/min' if minutes else ''
+        return f'trimmed {trimmed:.1f}s of silence{cost}' if trimmed > 0 else f'added {-trimmed:.1f}s of pauses{cost}'
+
+
+def play_audio_file(audio_path):
+    """Play an audio file with the platform's player. Blocks until playback ends."""
+    import platform
+    if not audio_path.lower().endswith('.wav') and platform.system() != 'Darwin':
+        # winsound and aplay only understand WAV: decode compressed outputs to a temp copy
+        import tempfile
+        audio, samplerate = sf.read(audio_path, dtype='float32')
+        fd, wav_path = tempfile.mkstemp(suffix='.wav')
+        os.close(fd)
+        try:
+            sf.write(wav_path, audio, samplerate, subtype='PCM_16')
+            return play_audio_file(wav_path)
+        finally:
+            os.remove(wav_path)
+    if platform.system() == 'Windows':
+        import winsound
+        winsound.PlaySound(audio_path, winsound.SND_FILENAME)
+    else:
+        # On Linux/Mac, try using subprocess with available player
+        import subprocess
+        subprocess.run(['afplay', audio_path] if platform.system() == 'Darwin' else ['aplay', audio_path], check=False)
+
+
+class AudioRingBuffer:
+    """Bounded single-producer/single-consumer ring buffer of float32 samples.
+
+    The producer blocks in write() while the buffer is full, the consumer blocks
+    in read() while it is empty. close() marks the end of the stream.
+    """
+
+    def __init__(self, capacity=SAMPLE_RATE * PREVIEW_BUFFER_SECONDS):
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self._capacity = capacity
+        # Absolute sample counters; positions in the buffer are taken modulo capacity
+        self._read = 0
+        self._written = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def total_written(self):
+        return self._written
+
+    def write(self, samples, cancel_event=None):
+        """Append samples, waiting for free space. Returns False if the stream was closed or cancelled."""
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        pos = 0
+        while pos < len(samples):
+            with self._cond:
+                while self._written - self._read >= self._capacity and not self._closed:
+                    if cancel_event is not None and cancel_event.is_set():
+                        return False
+                    self._cond.wait(0.1)
+                if self._closed:
+                    return False
+                n = min(self._capacity - (self._written - self._read), len(samples) - pos)
+                start = self._written % self._capacity
+                first = min(n, self._capacity - start)
+                self._buf[start:start + first] = samples[pos:pos + first]
+                self._buf[:n - first] = samples[pos + first:pos + n]
+                self._written += n
+                pos += n
+                self._cond.notify_all()
+        return True
+
+    def read(self, max_frames, timeout=None):
+        """Return up to max_frames samples, an empty array on timeout, or None once closed and drained."""
+        with self._cond:
+            if self._written == self._read and not self._closed:
+                self._cond.wait(timeout)
+            available = self._written - self._read
+            if available == 0:
+                return None if self._closed else np.zeros(0, dtype=np.float32)
+            n = min(available, max_frames)
+            start = self._read % self._capacity
+            first = min(n, self._capacity - start)
+            out = np.concatenate((self._buf[start:start + first], self._buf[:n - first]))
+            self._read += n
+            self._cond.notify_all()
+            return out
+
+    def close(self):
+        """Mark the end of the stream and wake any waiting reader or writer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class NullSink:
+    """Audio sink that discards samples. Used for headless runs and tests."""
+
+    def __init__(self):
+        self.frames = 0
+        self.error = None
+
+    def open(self, samplerate):
+        pass
+
+    def write(self, block):
+        self.frames += len(block)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+class FileSink(NullSink):
+    """Audio sink that streams samples into a sound file."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._writer = None
+
+    def open(self, samplerate):
+        self._writer = StreamingAudioWriter(self.path, samplerate=samplerate)
+
+    def write(self, block):
+        super().write(block)
+        self._writer.write(block)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    abort = close
+
+
+class PlayerSink(FileSink):
+    """Fallback sink: collect the preview into a file, then hand it to the system player."""
+
+    def close(self):
+        super().close()
+        if self.frames:
+            play_audio_file(self.path)
+
+    def abort(self):
+        FileSink.close(self)
+
+
+class SoundDeviceSink(NullSink):
+    """In-process playback through the optional sounddevice package."""
+
+    def open(self, samplerate):
+        import sounddevice as sd
+        self._stream = sd.OutputStream(samplerate=samplerate, channels=1, dtype='float32')
+        self._stream.start()
+
+    def write(self, block):
+        super().write(block)
+        self._stream.write(block.reshape(-1, 1))
+
+    def close(self):
+        self._stream.stop()
+        self._stream.close()
+
+    def abort(self):
+        self._stream.abort()
+        self._stream.close()
+
+
+class AplaySink(NullSink):
+    """Stream raw samples into aplay's stdin (Linux, no extra Python packages needed)."""
+
+    def open(self, samplerate):
+        import subprocess
+        self._proc = subprocess.Popen(
+            ['aplay', '-q', '-t', 'raw', '-f', 'FLOAT_LE', '-r', str(samplerate), '-c', '1', '-'],
+            stdin=subprocess.PIPE
+        )
+
+    def write(self, block):
+        super().write(block)
+        self._proc.stdin.write(block.astype('<f4').tobytes())
+
+    def close(self):
+        self._proc.stdin.close()
+        self._proc.wait()
+
+    def abort(self):
+        self._proc.kill()
+        self._proc.wait()
+
+
+def create_preview_sink(kind=None):
+    """Return the audio sink used for previews, falling back to what this system supports."""
+    kind = kind or PREVIEW_SINK
+    if kind == 'null':
+        return NullSink()
+    if kind == 'file':
+        return FileSink(PREVIEW_PATH)
+    if kind in ('auto', 'sounddevice'):
+        try:
+            import sounddevice  # noqa: F401
+            return SoundDeviceSink()
+        except Exception:
+            if kind == 'sounddevice':
+                raise
+    if kind in ('auto', 'aplay') and sys.platform.startswith('linux') and shutil.which('aplay'):
+        return AplaySink()
+    return PlayerSink(PREVIEW_PATH)
+
+
+def play_from_buffer(ring, sink, cancel_event, on_first_audio=None, block_frames=SAMPLE_RATE // 10):
+    """Drain a ring buffer into an audio sink until the stream ends or is cancelled.
+
+    Runs on its own thread. Errors are stored on ``sink.error`` and close the
+    ring buffer so the producer stops instead of waiting for free space.
+    """
+    opened = False
+    try:
+        while not cancel_event.is_set():
+            block = ring.read(block_frames, timeout=0.1)
+            if block is None:
+                break
+            if not len(block):
+                continue
+            if not opened:
+                sink.open(SAMPLE_RATE)
+                opened = True
+                if on_first_audio:
+                    on_first_audio()
+            sink.write(block)
+        if opened:
+            sink.abort() if cancel_event.is_set() else sink.close()
+    except Exception as e:
+        sink.error = e
+        ring.close()
+        try:
+            if opened:
+                sink.abort()
+        except Exception:
+            pass
+
+
+def get_model_version() -> str:
+    """Return the installed Kokoro version; part of every cache key."""
+    try:
+        from importlib.metadata import version
+        return f"kokoro-{version('kokoro')}"
+    except Exception:
+        return 'kokoro-unknown'
+
+
+class ChunkCache:
+    """Content-addressed on-disk cache of synthesized chunk audio.
+
+    Entries are 16-bit FLAC files named by a SHA-256 of everything that affects
+    the audio. A file's mtime records its last use, so the LRU order survives
+    restarts; the oldest entries are removed once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._model_version = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index = None  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+
+    @property
+    def model_version(self):
+        # Resolved on first use to keep importlib.metadata off the startup path
+        if self._model_version is None:
+            self._model_version = get_model_version()
+        return self._model_version
+
+    def key(self, text, voice, lang, speed):
+        payload = json.dumps([text, voice, lang, round(float(speed), 3), self.model_version])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.flac')
+
+    def _ensure_index(self):
+        """Build the LRU index from the files on disk (called with the lock held)."""
+        if self._index is not None:
+            return
+        entries = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for name in filenames:
+                if name.endswith('.flac'):
+                    try:
+                        st = os.stat(os.path.join(dirpath, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    @timed('cache_read')
+    def get(self, key):
+        """Return cached audio for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            audio, _ = sf.read(path, dtype='float32')
+            os.utime(path)
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            if self._index is not None and key in self._index:
+                self._index.move_to_end(key)
+        return audio
+
+    @timed('cache_write')
+    def put(self, key, audio):
+        """Store audio under key and evict old entries beyond the size budget."""
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            sf.write(tmp_path, audio, SAMPLE_RATE, format='FLAC', subtype='PCM_16')
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self._lock:
+            self._ensure_index()
+            self._total_bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, old_size = self._index.popitem(last=False)
+                self._total_bytes -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return self.hits, self.misses
+
+
+chunk_cache = ChunkCache(CHUNK_CACHE_DIR, CHUNK_CACHE_MAX_MB * 1024 * 1024) if CHUNK_CACHE_MAX_MB else None
+
+
+class G2PCache:
+    """Memoized grapheme-to-phoneme conversion keyed by (lang, normalized sentence).
+
+    An in-memory LRU sits in front of an optional SQLite store, so repeated
+    sentences and boilerplate are phonemized once across chunks, jobs and
+    restarts, however the text around them was chunked. Time
+    saved is estimated from the average cost of a miss.
+    """
+
+    def __init__(self, max_entries, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.miss_time = 0.0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_failed = False
+
+    def _connect(self):
+        """Open the SQLite store on first use (called with the lock held)."""
+        if self._db is None and self.path and not self._db_failed:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS g2p (lang TEXT, unit TEXT, phonemes TEXT, PRIMARY KEY (lang, unit))'
+                )
+            except sqlite3.Error:
+                self._db = None
+                self._db_failed = True
+        return self._db
+
+    def _remember(self, key, phonemes):
+        self._memory[key] = phonemes
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def phonemize_many(self, pipeline, lang, units):
+        """Return the phoneme string for each unit, running the pipeline's G2P only on misses.
+
+        The whole list is looked up in one pass (one SQLite query) and the
+        misses are stored in one transaction, so a group of chunks costs one
+        round trip to the store rather than one per unit.
+        """
+        units = [' '.join(unit.split()) for unit in units]
+        found = {}
+        with self._lock:
+            missing = []
+            for unit in dict.fromkeys(units):
+                phonemes = self._memory.get((lang, unit))
+                if phonemes is None:
+                    missing.append(unit)
+                else:
+                    found[unit] = phonemes
+                    self._remember((lang, unit), phonemes)
+            db = self._connect() if missing else None
+            if db is not None:
+                try:
+                    for i in range(0, len(missing), 500):
+                        batch = missing[i:i + 500]
+                        rows = db.execute(
+                            'SELECT unit, phonemes FROM g2p WHERE lang = ? AND unit IN (%s)' % ','.join('?' * len(batch)),
+                            [lang] + batch,
+                        ).fetchall()
+                        for unit, phonemes in rows:
+                            found[unit] = phonemes
+                            self._remember((lang, unit), phonemes)
+                except sqlite3.Error:
+                    pass
+            self.hits += sum(1 for unit in units if unit in found)
+            missing = [unit for unit in missing if unit not in found]
+
+        computed = []
+        for unit in missing:
+            start = time.perf_counter()
+            phonemes = pipeline.g2p(unit)[0] or ''
+            elapsed = time.perf_counter() - start
+            found[unit] = phonemes
+            computed.append((lang, unit, phonemes))
+            with self._lock:
+                self.misses += 1
+                self.miss_time += elapsed
+
+        if computed:
+            with self._lock:
+                for row in computed:
+                    self._remember(row[:2], row[2])
+                db = self._connect()
+                if db is not None:
+                    try:
+                        with db:
+                            db.executemany('INSERT OR REPLACE INTO g2p VALUES (?, ?, ?)', computed)
+                    except sqlite3.Error:
+                        pass
+        return [found[unit] for unit in units]
+
+    def phonemize(self, pipeline, lang, text):
+        """Return the phoneme string for text, running the pipeline's G2P only on a miss."""
+        return self.phonemize_many(pipeline, lang, [text])[0]
+
+    def stats(self):
+        """Return (hits, misses, estimated seconds saved)."""
+        with self._lock:
+            avg_miss = self.miss_time / self.misses if self.misses else 0.0
+            return self.hits, self.misses, self.hits * avg_miss
+
+
+g2p_cache = G2PCache(G2P_CACHE_ENTRIES, G2P_CACHE_PATH) if G2P_CACHE_ENTRIES else None
+
+
+class HistoryStore:
+    """Append-only log of finished jobs in SQLite, read back newest first a page at a time.
+
+    Recording a job is a single INSERT, so it costs the same however long the
+    log grows; nothing is rewritten or truncated. Entries from the old JSON
+    history file are imported the first time the store opens; the file itself
+    is left alone. If SQLite is unusable the store stays empty rather than failing jobs.
+    """
+
+    COLUMNS = ('timestamp', 'filename', 'path', 'voice', 'lang_mix', 'word_count',
+               'audio_seconds', 'wall_seconds', 'rtf', 'size_bytes')
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_failed = False
+
+    def _connect(self):
+        """Open the database on first use (called with the lock held)."""
+        if self._db is None and not self._db_failed:
+            try:
+                self._db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                with self._db:
+                    self._db.execute(
+                        'CREATE TABLE IF NOT EXISTS history (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, '
+                        'filename TEXT, path TEXT, voice TEXT, lang_mix TEXT, word_count INTEGER, '
+                        'audio_seconds REAL, wall_seconds REAL, rtf REAL, size_bytes INTEGER)'
+                    )
+                    self._db.execute('CREATE INDEX IF NOT EXISTS history_voice ON history (voice)')
+                    self._db.execute('CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)')
+                self._migrate()
+            except sqlite3.Error:
+                self._db = None
+                self._db_failed = True
+        return self._db
+
+    def _migrate(self):
+        """Import the legacy JSON history once; the schema version records that it happened."""
+        if self._db.execute('PRAGMA user_version').fetchone()[0] >= 1:
+            return
+        entries = []
+        if self.legacy_json and os.path.exists(self.legacy_json):
+            try:
+                with open(self.legacy_json, 'r') as f:
+                    entries = json.load(f).get('history', [])
+            except (OSError, ValueError, AttributeError):
+                entries = []
+        rows = [(e.get('timestamp') or '', e.get('filename'), e.get('path'), e.get('voice'), e.get('word_count'))
+                for e in entries if isinstance(e, dict)]
+        with self._db:
+            self._db.executemany(
+                'INSERT INTO history (timestamp, filename, path, voice, word_count) VALUES (?, ?, ?, ?, ?)', rows
+            )
+            self._db.execute('PRAGMA user_version = 1')
+
+    def add(self, **entry):
+        """Append one job; returns the stored entry (with its id), or None if the store is unavailable."""
+        entry = {column: entry.get(column) for column in self.COLUMNS}
+        entry['timestamp'] = entry['timestamp'] or datetime.now().isoformat()
+        values = [json.dumps(value) if column == 'lang_mix' and value is not None else value
+                  for column, value in entry.items()]
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            try:
+                with db:
+                    cursor = db.execute(f"INSERT INTO history ({', '.join(self.COLUMNS)}) "
+                                        f"VALUES ({', '.join('?' * len(self.COLUMNS))})", values)
+            except sqlite3.Error:
+                return None
+        return {'id': cursor.lastrowid, **entry}
+
+    def page(self, query='', before_id=None, limit=HISTORY_PAGE_SIZE):
+        """Up to limit entries older than before_id, newest first.
+
+        query matches a voice code, part of a file name, or the start of the
+        timestamp (so '2025-03' finds everything from March 2025).
+        """
+        where, params = [], []
+        if before_id is not None:
+            where.append('id < ?')
+            params.append(before_id)
+        # Match the search text literally: escape LIKE's wildcards
+        query = re.sub(r'([\\%_])', r'\\\1', query.strip().lower())
+        if query:
+            where.append("(voice LIKE ? ESCAPE '\\' OR filename LIKE ? ESCAPE '\\' OR timestamp LIKE ? ESCAPE '\\')")
+            params += [f'%{query}%', f'%{query}%', f'{query}%']
+        sql = f"SELECT id, {', '.join(self.COLUMNS)} FROM history"
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return []
+            try:
+                rows = db.execute(sql, params + [limit]).fetchall()
+            except sqlite3.Error:
+                return []
+        entries = []
+        for row in rows:
+            entry = dict(zip(('id',) + self.COLUMNS, row))
+            if entry['lang_mix']:
+                entry['lang_mix'] = json.loads(entry['lang_mix'])
+            entries.append(entry)
+        return entries
+
+
+@timed('detect_language')
+def detect_language_code(text: str) -> str:
+    """Detect language from text and return appropriate language code for Kokoro."""
+    # Simple character-based language detection
+    # Bengali/Bangla script (U+0980 - U+09FF)
+    bengali_chars = re.search(r'[\u0980-\u09FF]', text)
+    if bengali_chars:
+        return 'bn'  # Bengali language code
+
+    # Hindi/Devanagari script
+    hindi_chars = re.search(r'[\u0900-\u097F]', text)
+    if hindi_chars:
+        return 'hi'
+
+    # Chinese characters
+    chinese_chars = re.search(r'[\u4E00-\u9FFF\u3040-\u309F\u30A0-\u30FF]', text)
+    if chinese_chars:
+        # Check for Japanese hiragana/katakana vs Chinese hanzi
+        japanese_chars = re.search(r'[\u3040-\u309F\u30A0-\u30FF]', text)
+        if japanese_chars and len(japanese_chars.group()) > len(chinese_chars.group()) * 0.3:
+            return 'ja'
+        return 'zh'
+
+    # Japanese (if no Chinese but has hiragana/katakana)
+    japanese_chars = re.search(r'[\u3040-\u309F\u30A0-\u30FF]', text)
+    if japanese_chars:
+        return 'ja'
+
+    return detect_latin_language(text)
+
+
+_INDONESIAN_WORDS = re.compile(r'\b(saya|anda|dia|mereka)\b')
+# Portuguese has these accented characters
+_PORTUGUESE_HINT = re.compile(r'[\xE0\xE1\xE9\xED\xF3\xFA\xE3\xF5\xE7]')
+_FINNISH_HINT = re.compile(r'[\u00E4\u00F6\xE4\xF6]')  # ä ö
+
+
+def detect_latin_language(text: str) -> str:
+    """Pick a Kokoro language code for Latin-script text (English unless the heuristics say otherwise)."""
+    text_lower = text.lower()
+
+    # Indonesian
+    if 'indonesia' in text_lower or _INDONESIAN_WORDS.search(text_lower):
+        return 'id'
+
+    # Portuguese
+    if _PORTUGUESE_HINT.search(text):
+        return 'pt'
+
+    # Finnish
+    if _FINNISH_HINT.search(text):
+        return 'fi'
+
+    # Default to English
+    return 'a'  # Kokoro default (English)
+
+
+def transliterate_bengali_to_hindi(text: str) -> str:
+    """Convert Bengali text to Hindi (Devanagari) for better voice synthesis."""
+    try:
+        from bangla import convert
+        # Try converting Bengali to phonetic representation
+        # This is a workaround since Kokoro doesn't have native Bengali support
+        return text
+    except Exception:
+        return text
+
+
+def get_optimal_voice_for_language(voice_code: str, lang_code: str) -> tuple:
+    """Ensure voice matches the language for better results."""
+
+    # Bengali (bn) should use Hindi voices since they're similar
+    if lang_code == 'bn':
+        lang_code = 'hi'  # Use Hindi pipeline for Bengali
+        # If user selected Hindi voices, keep them; otherwise default to Hindi voices
+        voice_prefix = voice_code[:3]
+        if voice_prefix in ['hf_', 'hm_']:
+            return voice_code, lang_code
+        else:
+            return 'hm_omega', lang_code  # Best Hindi voice for Bengali
+
+    # Check if current voice supports the detected language
+    voice_prefix = voice_code[:3]
+    if voice_prefix in VOICE_LANG_MAP:
+        supported_langs = VOICE_LANG_MAP[voice_prefix]
+        if lang_code in supported_langs:
+            return voice_code, lang_code
+
+    # If voice doesn't support language, find a compatible voice
+    # For now, default to English with English voice
+    if lang_code == 'a' or lang_code == 'en':
+        return 'af_heart', 'a'  # Default English
+
+    fallback_voice = DEFAULT_VOICE_BY_LANG.get(lang_code, 'af_heart')
+    fallback_lang = lang_code if lang_code != 'bn' else 'hi'
+    return fallback_voice, fallback_lang
+
+
+# Script classes for the segmenter. The danda (U+0964/5) is shared punctuation, not Devanagari text.
+_SCRIPT_CLASSES = {
+    'bn': '\u0980-\u09FF',
+    'hi': '\u0900-\u0963\u0966-\u097F',
+    'cjk': '\u3040-\u309F\u30A0-\u30FF\u4E00-\u9FFF',
+    'latin': 'A-Za-z\u00C0-\u024F',
+}
+# A run is letters of one script, joined by anything that is not a letter of another script
+_NEUTRAL = '[^%s]' % ''.join(_SCRIPT_CLASSES.values())
+_SCRIPT_RUN = re.compile('|'.join(
+    '(?P<%s>[%s](?:%s*[%s])*)' % (name, chars, _NEUTRAL, chars) for name, chars in _SCRIPT_CLASSES.items()
+))
+_CLOSING_PUNCTUATION = '.,;:!?)]}"\'\u0964\u0965\u3001\u3002\uFF01\uFF0C\uFF1F\u300D\u300F\u201D\u2019'
+_KANA = re.compile(r'[\u3040-\u309F\u30A0-\u30FF]')
+# Characters at the start of a file searched for kana to tell Japanese from Chinese documents
+CJK_PROBE_CHARS = 65536
+_PARAGRAPH = re.compile(r'(?:[^\n]+|\n(?![ \t]*\n))+')
+# Text that ends a sentence: terminal punctuation, then any closing quotes or brackets
+_SENTENCE_END = re.compile(r'[.!?\u2026\u0964\u0965\u3002\uFF01\uFF1F][)\]}"\'\u300D\u300F\u201D\u2019]*\s*$')
+
+
+class TextRun(str):
+    """Text tagged with the Kokoro language code the segmenter assigned to it.
+
+    ends_sentence is False when the text stops mid-sentence (the sentence
+    continues in the next run or chunk), so joins there need no pause.
+    """
+
+    def __new__(cls, text, lang=None, ends_sentence=True):
+        run = super().__new__(cls, text)
+        run.lang = lang
+        run.ends_sentence = ends_sentence
+        return run
+
+
+def iter_script_runs(text: str, cjk_lang: str = None):
+    """Yield (lang, text) runs of a single script, walking the text once.
+
+    Bengali, Devanagari, CJK and Latin letters each form runs. A CJK run is
+    Japanese if it or any other part of its paragraph has kana; kanji-only
+    paragraphs (a heading such as 第一章) take cjk_lang, by default 'ja' if
+    the text has kana anywhere and 'zh' otherwise; only script-neutral text (spaces, digits,
+    punctuation) joins the run around it, with closing punctuation kept on the
+    run it ends. Every change of script starts a new run, however short, so a
+    word is always read by its own language's pipeline. Latin runs are labelled
+    with detect_latin_language. The text is a TextRun whose ends_sentence is
+    False when the run stops mid-sentence. Runs never span paragraphs, and
+    concatenating the runs of a paragraph gives back the paragraph.
+    """
+    if cjk_lang is None:
+        cjk_lang = 'ja' if _KANA.search(text) else 'zh'
+    for paragraph in _PARAGRAPH.finditer(text):
+        paragraph = paragraph.group()
+        pending_lang, pending, pos = None, [], 0
+        paragraph_cjk = None
+        for match in _SCRIPT_RUN.finditer(paragraph):
+            lang, run = match.lastgroup, match.group()
+            if lang == 'cjk':
+                if paragraph_cjk is None:
+                    paragraph_cjk = 'ja' if _KANA.search(paragraph) else cjk_lang
+                lang = paragraph_cjk
+            elif lang == 'latin':
+                lang = detect_latin_language(run)
+            gap, pos = paragraph[pos:match.start()], match.end()
+            if pending_lang is None:
+                pending_lang = lang
+            elif lang != pending_lang:
+                closing = len(gap) - len(gap.lstrip(_CLOSING_PUNCTUATION))
+                pending.append(gap[:closing])
+                text_run = ''.join(pending)
+                if text_run.strip():
+                    yield pending_lang, TextRun(text_run, pending_lang, _SENTENCE_END.search(text_run) is not None)
+                pending, gap = [], gap[closing:]
+                pending_lang = lang
+            pending += [gap, run]
+        pending.append(paragraph[pos:])
+        if pending_lang is None:
+            # Digits and punctuation only: the English pipeline reads them
+            pending_lang = 'a'
+        run = ''.join(pending)
+        if run.strip():
+            yield pending_lang, TextRun(run, pending_lang)
+
+
+def iter_word_chunks(text: str, max_words: int = 50):
+    """Yield chunks of max_words words (max 50 words per chunk for CPU efficiency)."""
+    current_chunk = []
+    for match in re.finditer(r'\S+', text):
+        current_chunk.append(match.group())
+        if len(current_chunk) >= max_words:
+            yield ' '.join(current_chunk)
+            current_chunk = []
+
+    # Add remaining words
+    if current_chunk:
+        yield ' '.join(current_chunk)
+
+
+# Non-Latin characters expand to several phonemes each; Latin text is roughly one per character
+_MULTI_TOKEN_CHARS = re.compile(r'[\u0900-\u09FF\u3040-\u30FF\u4E00-\u9FFF]')
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap estimate of the phoneme tokens Kokoro will see for text."""
+    return len(text) + 2 * len(_MULTI_TOKEN_CHARS.findall(text))
+
+
+# pysbd language for each detected language code (others segment with English rules)
+_PYSBD_LANG = {'hi': 'hi', 'bn': 'hi', 'ja': 'ja', 'zh': 'zh'}
+_FALLBACK_SENTENCE_END = re.compile(r'(?<=[.!?।。！？])\s+')
+# pysbd segmenters keep per-call state, so every thread gets its own
+_segmenters = threading.local()
+
+
+def split_sentences(paragraph: str, lang_code: str = None) -> list:
+    """Split one paragraph into sentences with pysbd, or a punctuation regex if it is unavailable.
+
+    lang_code is the paragraph's language when the caller already knows it.
+    """
+    lang = _PYSBD_LANG.get(lang_code or detect_language_code(paragraph), 'en')
+    try:
+        segmenters = _segmenters.__dict__
+        segmenter = segmenters.get(lang)
+        if segmenter is None:
+            import pysbd
+            segmenter = segmenters[lang] = pysbd.Segmenter(language=lang, clean=False)
+        sentences = segmenter.segment(paragraph)
+    except Exception:
+        sentences = _FALLBACK_SENTENCE_END.split(paragraph)
+    return [s.strip() for s in sentences if s.strip()]
+
+
+def iter_sentence_chunks(text: str, max_tokens: int = CHUNK_TOKEN_BUDGET, lang_code: str = None):
+    """Yield chunks of whole sentences, packed up to max_tokens estimated tokens.
+
+    Works one paragraph (blank-line separated block) at a time, so large inputs
+    are streamed rather than segmented in one go. Chunks never span paragraphs.
+    A sentence longer than the budget is split on word boundaries.
+    """
+    for paragraph in _PARAGRAPH.finditer(text):
+        paragraph = ' '.join(paragraph.group().split())
+        if not paragraph:
+            continue
+        current, current_tokens = [], 0
+        for sentence in split_sentences(paragraph, lang_code):
+            tokens = estimate_tokens(sentence)
+            if current and current_tokens + 1 + tokens > max_tokens:
+                yield ' '.join(current)
+                current, current_tokens = [], 0
+            if tokens <= max_tokens:
+                current.append(sentence)
+                current_tokens += tokens + (1 if current_tokens else 0)
+                continue
+            # Oversized sentence: fall back to packing its words
+            for word in sentence.split():
+                word_tokens = estimate_tokens(word)
+                if current and current_tokens + 1 + word_tokens > max_tokens:
+                    yield ' '.join(current)
+                    current, current_tokens = [], 0
+                current.append(word)
+                current_tokens += word_tokens + (1 if current_tokens else 0)
+        if current:
+            yield ' '.join(current)
+
+
+def iter_chunks(text: str, chunker: str = None, max_words: int = 50, max_tokens: int = CHUNK_TOKEN_BUDGET,
+                cjk_lang: str = None):
+    """Lazily chunk text with the given strategy ('sentence' or 'words'; default CHUNKER).
+
+    'sentence' segments the text into script runs first, so chunks never mix
+    scripts; each chunk is a TextRun carrying its language for prepare_chunk
+    and whether it ends a sentence for ChunkJoiner. 'words' is the legacy
+    splitter: plain max_words chunks over the whole text, exactly as before
+    segmentation existed, with the language detected per chunk. cjk_lang is
+    passed to iter_script_runs.
+    """
+    if (chunker or CHUNKER) == 'words':
+        yield from iter_word_chunks(text, max_words)
+        return
+    for lang, run in iter_script_runs(text, cjk_lang):
+        pieces = iter_sentence_chunks(run, max_tokens, lang)
+        previous = None
+        for piece in pieces:
+            if previous is not None:
+                yield TextRun(previous, lang, _SENTENCE_END.search(previous) is not None)
+            previous = piece
+        if previous is not None:
+            # The last chunk of a run ends where the run does
+            yield TextRun(previous, lang, run.ends_sentence or _SENTENCE_END.search(previous) is not None)
+
+
+def chunk_text(text: str, chunker: str = None, max_words: int = 50, max_tokens: int = CHUNK_TOKEN_BUDGET) -> list:
+    """Split text into a list of chunks; see iter_chunks."""
+    chunks = list(iter_chunks(text, chunker, max_words, max_tokens))
+    return chunks if chunks else [text]
+
+
+def estimate_text_stats(text: str, speed: float = 1.0, chunker: str = None, max_words: int = 50,
+                        max_tokens: int = CHUNK_TOKEN_BUDGET) -> dict:
+    """Characters, words, estimated chunks and audio seconds for text, without running the chunker.
+
+    Chunks are estimated per script run (see iter_script_runs) from the token
+    count, which is what the sentence chunker packs against, or from the word
+    count of the whole text for the words chunker; audio length from
+    SPEECH_TOKENS_PER_SECOND.
+    """
+    by_words = (chunker or CHUNKER) == 'words'
+    words = tokens = chunks = 0
+    for _, run in iter_script_runs(text):
+        run_words = len(run.split())
+        if not run_words:
+            continue
+        run_tokens = estimate_tokens(run)
+        words += run_words
+        tokens += run_tokens
+        chunks += -(-run_tokens // max_tokens)
+    if by_words:
+        chunks = -(-words // max_words)
+    return {
+        'characters': len(text),
+        'words': words,
+        'chunks': chunks,
+        'audio_seconds': tokens / SPEECH_TOKENS_PER_SECOND / (speed or 1.0),
+    }
+
+
+def count_languages(chunk, counts: dict) -> dict:
+    """Add chunk's characters to counts under its language code (TextRun tag, else detected)."""
+    lang = getattr(chunk, 'lang', None) or detect_language_code(chunk)
+    counts[lang] = counts.get(lang, 0) + len(chunk)
+    return counts
+
+
+def language_mix(counts: dict) -> dict:
+    """Characters per language code as shares of the total, e.g. {'a': 0.8, 'bn': 0.2}."""
+    total = sum(counts.values())
+    return {lang: round(count / total, 3) for lang, count in counts.items()} if total else {}
+
+
+def format_duration(seconds: float) -> str:
+    """'m:ss', or 'h:mm:ss' from an hour up."""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f'{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+    return f'{seconds // 60}:{seconds % 60:02d}'
+
+
+# Byte order marks -> (codec, BOM length); files without one are read as UTF-8
+_TEXT_BOMS = (
+    (b'\xef\xbb\xbf', 'utf-8', 3),
+    (b'\xff\xfe', 'utf-16-le', 2),
+    (b'\xfe\xff', 'utf-16-be', 2),
+)
+_PARAGRAPH_BREAK = re.compile(r'\n[ \t\r]*\n')
+
+
+class MappedTextFile:
+    """A text file memory-mapped read-only and decoded a block at a time.
+
+    UTF-8 and UTF-16 are recognized by their byte order mark (UTF-16 without
+    one by its zero bytes); anything else is read as UTF-8 with undecodable
+    bytes replaced. Only the block being decoded is ever held as str.
+    """
+
+    def __init__(self, path):
+        import mmap
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        head = self._map[:4096]
+        for bom, encoding, length in _TEXT_BOMS:
+            if head.startswith(bom):
+                self.encoding, self.start = encoding, length
+                break
+        else:
+            self.start = 0
+            if head[1::2].count(0) > len(head) // 4:
+                self.encoding = 'utf-16-le'
+            elif head[0::2].count(0) > len(head) // 4:
+                self.encoding = 'utf-16-be'
+            else:
+                self.encoding = 'utf-8'
+
+    def excerpt(self, max_chars=4000):
+        """The first max_chars characters of the file."""
+        import codecs
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        # At most 4 bytes per character in any supported encoding
+        return decoder.decode(self._map[self.start:self.start + max_chars * 4])[:max_chars]
+
+    def iter_paragraphs(self, block_bytes=1 << 20):
+        """Yield (paragraph, end_offset): blank-line separated text and the byte offset just past it.
+
+        Decodes block_bytes at a time. A paragraph longer than a block is cut
+        at the last line break (or space) in the block instead.
+        """
+        import codecs
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
+        carry, offset, pos = '', self.start, self.start
+        while pos < self.size:
+            end = min(pos + block_bytes, self.size)
+            text = carry + decoder.decode(self._map[pos:end], final=end == self.size)
+            pos = end
+            if pos < self.size:
+                # Keep the (possibly unfinished) last paragraph for the next block
+                breaks = [m.end() for m in _PARAGRAPH_BREAK.finditer(text)]
+                cut = breaks[-1] if breaks else max(text.rfind('\n'), text.rfind(' ')) + 1
+                if cut <= 0:
+                    carry = text
+                    continue
+                text, carry = text[:cut], text[cut:]
+            else:
+                carry = ''
+            last = 0
+            for match in _PARAGRAPH_BREAK.finditer(text):
+                offset += len(text[last:match.end()].encode(self.encoding, 'replace'))
+                yield text[last:match.start()], offset
+                last = match.end()
+            if last < len(text):
+                offset += len(text[last:].encode(self.encoding, 'replace'))
+                yield text[last:], offset
+
+    def close(self):
+        if self.size:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_file_chunks(source, chunker: str = None, max_words: int = 50, max_tokens: int = CHUNK_TOKEN_BUDGET):
+    """Lazily chunk a MappedTextFile; yields (chunk, byte_offset) with the offset just past the chunk's paragraph.
+
+    Paragraphs are chunked one at a time, so kanji-only paragraphs are read as
+    Japanese once kana has turned up in the file's opening or any earlier paragraph.
+    """
+    cjk_lang = 'ja' if _KANA.search(source.excerpt(CJK_PROBE_CHARS)) else 'zh'
+    for paragraph, offset in source.iter_paragraphs():
+        if cjk_lang == 'zh' and _KANA.search(paragraph):
+            cjk_lang = 'ja'
+        for chunk in iter_chunks(paragraph, chunker, max_words, max_tokens, cjk_lang):
+            yield chunk, offset
+
+
+def init_device():
+    """Pick the torch device on first use (keeps the torch import off the startup path)."""
+    global device
+    if device is None:
+        try:
+            import torch
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        except Exception:
+            device = "cpu"
+    return device
+
+
+def get_voice_code(voice_input):
+    """Convert voice code or friendly name to voice code."""
+    voice_input = voice_input.strip().lower()
+
+    # Check if it's already a voice code
+    if voice_input in VOICE_LIST:
+        return voice_input
+
+    # Check friendly names mapping - find the code for this friendly name
+    for code, friendly in VOICE_NAMES.items():
+        if voice_input == friendly.lower():
+            return code
+        # Also check if the voice name (without locale) matches
+        if voice_input in friendly.lower():
+            return code
+
+    return voice_input  # Return as-is if not found
+
+
+def voice_language(voice_code: str) -> str:
+    """Return the pipeline language a voice is native to."""
+    return VOICE_LANG_MAP.get(voice_code[:3], ['a'])[0]
+
+
+def get_rss_bytes() -> int:
+    """Resident set size of this process in bytes, or 0 if it can't be determined."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        return 0
+
+
+class PipelineManager:
+    """Thread-safe, bounded cache of Kokoro pipelines keyed by language code.
+
+    A per-language lock makes sure each pipeline is constructed once even when
+    a preview and a generation ask for it at the same time, while loads of
+    different languages can proceed in parallel. lock() hands out the locks
+    that callers hold while they use a pipeline.
+    """
+
+    def __init__(self, factory, max_resident=MAX_RESIDENT_PIPELINES, rss_budget_bytes=PIPELINE_RSS_BUDGET_MB * 1024 * 1024):
+        self.factory = factory
+        self.max_resident = max_resident
+        self.rss_budget_bytes = rss_budget_bytes
+        self._pipelines = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._use_locks = weakref.WeakKeyDictionary()  # pipeline -> {'g2p': Lock, 'model': Lock}
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    def _lookup(self, key):
+        """Return a resident pipeline and mark it recently used (called with the lock held)."""
+        pipeline = self._pipelines.get(key)
+        if pipeline is not None:
+            self._pipelines.move_to_end(key)
+            self.hits += 1
+        return pipeline
+
+    def get(self, lang_code):
+        """Return the pipeline for lang_code, constructing it on first use."""
+        key = lang_code or 'a'
+        with self._lock:
+            pipeline = self._lookup(key)
+            if pipeline is not None:
+                return pipeline
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                pipeline = self._lookup(key)
+                if pipeline is not None:
+                    return pipeline
+
+            start = time.perf_counter()
+            pipeline = self.factory(lang_code=key)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._pipelines[key] = pipeline
+                self.loads += 1
+                self.load_time += elapsed
+            self._evict(keep=key)
+        return pipeline
+
+    def lock(self, pipeline, part='model'):
+        """Return the lock serializing one part ('g2p' or 'model') of a pipeline.
+
+        A KPipeline is not safe to call from several threads at once (espeak-based
+        G2P keeps global state; the model's voice cache and forward pass are
+        unguarded), so threads sharing one hold 'g2p' while phonemizing, 'model'
+        while synthesizing from phonemes, and both, 'g2p' first, around a full
+        pipeline call. Different pipelines still run in parallel, and one
+        pipeline's G2P can overlap its own inference.
+        """
+        with self._lock:
+            locks = self._use_locks.get(pipeline)
+            if locks is None:
+                locks = self._use_locks[pipeline] = {'g2p': threading.Lock(), 'model': threading.Lock()}
+            return locks[part]
+
+    def _evict(self, keep):
+        """Drop least recently used pipelines beyond the count or RSS budget."""
+        while True:
+            with self._lock:
+                over_count = len(self._pipelines) > max(1, self.max_resident)
+                over_rss = (self.rss_budget_bytes and len(self._pipelines) > 1
+                            and get_rss_bytes() > self.rss_budget_bytes)
+                if not (over_count or over_rss):
+                    return
+                victim = next((k for k in self._pipelines if k != keep), None)
+                if victim is None:
+                    return
+                del self._pipelines[victim]
+                self.evictions += 1
+            # Give the memory back before measuring RSS again
+            gc.collect()
+            if device == 'cuda':
+                try:
+                    import torch
+                    torch.cuda.empty_cache()
+                except Exception:
+                    pass
+
+    def resident(self):
+        with self._lock:
+            return list(self._pipelines)
+
+    def stats(self):
+        """Return load/hit counters, total load time and the resident languages."""
+        with self._lock:
+            return {
+                'loads': self.loads,
+                'hits': self.hits,
+                'evictions': self.evictions,
+                'load_time': round(self.load_time, 3),
+                'resident': list(self._pipelines),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._pipelines.clear()
+        gc.collect()
+
+
+_kpipeline_class = None
+_engine_lock = threading.Lock()
+
+
+def load_engine():
+    """Import kokoro on first use and return its KPipeline class. Thread-safe."""
+    global _kpipeline_class
+    with _engine_lock:
+        if _kpipeline_class is None:
+            from kokoro import KPipeline
+            _kpipeline_class = KPipeline
+    return _kpipeline_class
+
+
+def create_pipeline(lang_code):
+    return load_engine()(lang_code=lang_code)
+
+
+pipeline_manager = PipelineManager(create_pipeline)
+
+
+@timed('pipeline')
+def get_pipeline_for_lang(lang_code: str):
+    """Return cached Kokoro pipeline for a given language, creating if needed."""
+    return pipeline_manager.get(lang_code)
+
+
+def prepare_chunk(chunk: str, voice: str) -> tuple:
+    """Route a chunk to a pipeline: return (processed_text, chunk_voice, pipeline_lang)."""
+    chunk_lang = getattr(chunk, 'lang', None) or detect_language_code(chunk)
+    chunk_voice, pipeline_lang = get_optimal_voice_for_language(voice, chunk_lang)
+    processed_chunk = transliterate_bengali_to_hindi(chunk) if chunk_lang == 'bn' else chunk
+    return processed_chunk, chunk_voice, pipeline_lang
+
+
+def pack_phonemes(units, limit=510):
+    """Join per-sentence phoneme strings into as few segments of at most limit phonemes as possible.
+
+    Returns None if a single unit is over the limit (the full pipeline must split it).
+    """
+    segments, current = [], ''
+    for phonemes in units:
+        if not phonemes:
+            continue
+        if len(phonemes) > limit:
+            return None
+        if current and len(current) + 1 + len(phonemes) > limit:
+            segments.append(current)
+            current = ''
+        current = f'{current} {phonemes}' if current else phonemes
+    if current:
+        segments.append(current)
+    return segments
+
+
+@timed('g2p')
+def phonemize_group(pipeline, pipeline_lang, texts):
+    """Front-end for routed chunks that share a pipeline: return [(piece, phonemes), ...] per text.
+
+    Each text is split into newline-free pieces as the pipeline would split it;
+    a piece's phonemes are a list of segments for generate_from_tokens, or None
+    if the full pipeline must handle it (a sentence over 400 characters or 510
+    phonemes). With the G2P cache enabled, pieces are phonemized a sentence at
+    a time, so a sentence repeated anywhere in the text (or an earlier run)
+    is converted once, and every sentence of the group is looked up in one
+    pass. Without it each piece goes through G2P whole.
+    """
+    pieces = [[piece for piece in re.split(r'\n+', text.strip())] for text in texts]
+    if g2p_cache is not None:
+        units = {piece: [unit for unit in _FALLBACK_SENTENCE_END.split(piece) if unit.strip()]
+                 for text_pieces in pieces for piece in text_pieces}
+    else:
+        units = {piece: [piece] for text_pieces in pieces for piece in text_pieces if piece.strip()}
+    convertible = [unit for piece_units in units.values() if all(len(unit) <= 400 for unit in piece_units)
+                   for unit in piece_units]
+    with pipeline_manager.lock(pipeline, 'g2p'):
+        if g2p_cache is not None:
+            phonemes = dict(zip(convertible, g2p_cache.phonemize_many(pipeline, pipeline_lang, convertible)))
+        else:
+            phonemes = {unit: pipeline.g2p(unit)[0] or '' for unit in convertible}
+
+    prepared = []
+    for text_pieces in pieces:
+        entries = []
+        for piece in text_pieces:
+            piece_units = units.get(piece, [])
+            if all(unit in phonemes for unit in piece_units):
+                entries.append((piece, pack_phonemes([phonemes[unit] for unit in piece_units])))
+            else:
+                entries.append((piece, None))
+        prepared.append(entries)
+    return prepared
+
+
+@timed('inference')
+def synthesize_phonemes(pipeline, piece, phonemes, chunk_voice, speed):
+    """Return the audio blocks for a piece phonemized by phonemize_group."""
+    if phonemes is None:
+        with pipeline_manager.lock(pipeline, 'g2p'), pipeline_manager.lock(pipeline, 'model'):
+            return [np.asarray(audio) for _, _, audio in pipeline(piece, voice=chunk_voice, speed=speed)]
+    with pipeline_manager.lock(pipeline, 'model'):
+        return [np.asarray(result.audio) for segment in phonemes
+                for result in pipeline.generate_from_tokens(segment, voice=chunk_voice, speed=speed)]
+
+
+def synthesize_prepared(pipeline, pieces, chunk_voice, speed):
+    """Synthesize one chunk's [(piece, phonemes)] from phonemize_group and return its audio."""
+    segments = []
+    for piece, phonemes in pieces:
+        segments.extend(synthesize_phonemes(pipeline, piece, phonemes, chunk_voice, speed))
+    if not segments:
+        return np.zeros(0, dtype=np.float32)
+    with stage_timer('concatenate'):
+        return np.concatenate(segments, axis=0)
+
+
+def run_pipeline(processed_chunk, chunk_voice, pipeline_lang, speed):
+    """Run the Kokoro pipeline over one routed chunk and return its audio."""
+    return run_pipeline_batch([processed_chunk], chunk_voice, pipeline_lang, speed)[0]
+
+
+def run_pipeline_batch(texts, chunk_voice, pipeline_lang, speed, checkpoint=None):
+    """Synthesize several routed chunks that share a voice and pipeline, returning one array per chunk.
+
+    This is not model batching: Kokoro's model runs one utterance per forward
+    pass (durations are aligned per utterance), so chunks can't be padded into
+    a single tensor and inference time is the same as chunk by chunk. The group
+    only shares per-call overhead. With the G2P
+    cache enabled the group is phonemized in one pass (phonemize_group) and
+    each segment is synthesized from its phonemes. Otherwise the chunks go
+    through one KPipeline call as a list of segments, split exactly as a
+    single chunk would be, and each result's text_index maps the audio back to
+    its chunk. The output is identical to synthesizing the chunks one by one.
+
+    checkpoint, if given, is called before each chunk is synthesized, with no
+    pipeline lock held. Without the G2P cache the group is one uninterruptible
+    KPipeline call, so it is called once, before that call.
+    """
+    pipeline = get_pipeline_for_lang(pipeline_lang)
+    if g2p_cache is not None:
+        audios = []
+        for pieces in phonemize_group(pipeline, pipeline_lang, texts):
+            if checkpoint is not None:
+                checkpoint()
+            audios.append(synthesize_prepared(pipeline, pieces, chunk_voice, speed))
+        return audios
+    if checkpoint is not None:
+        checkpoint()
+
+    pieces, owners = [], []
+    for i, text in enumerate(texts):
+        for piece in re.split(r'\n+', text.strip()):
+            pieces.append(piece)
+            owners.append(i)
+
+    parts = [[] for _ in texts]
+    text_index = 0
+    with stage_timer('g2p+inference'), pipeline_manager.lock(pipeline, 'g2p'), pipeline_manager.lock(pipeline, 'model'):
+        if len(texts) == 1:
+            for _, _, audio in pipeline(texts[0], voice=chunk_voice, speed=speed, split_pattern=r'\n+'):
+                parts[0].append(np.asarray(audio))
+        else:
+            for result in pipeline(pieces, voice=chunk_voice, speed=speed):
+                text_index = getattr(result, 'text_index', None)
+                if text_index is None:
+                    # Engine doesn't report which segment a result belongs to: synthesize one by one
+                    break
+                parts[owners[text_index]].append(np.asarray(result.audio))
+    if text_index is None:
+        return [run_pipeline(text, chunk_voice, pipeline_lang, speed) for text in texts]
+    with stage_timer('concatenate'):
+        return [np.concatenate(p, axis=0) if p else np.zeros(0, dtype=np.float32) for p in parts]
+
+
+def synthesize_chunk(chunk, voice, speed, cache=None):
+    """Synthesize one text chunk, reusing cached audio when available."""
+    processed_chunk, chunk_voice, pipeline_lang = prepare_chunk(chunk, voice)
+
+    key = None
+    if cache is not None:
+        key = cache.key(processed_chunk, chunk_voice, pipeline_lang, speed)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    audio = run_pipeline(processed_chunk, chunk_voice, pipeline_lang, speed)
+    if key is not None and audio.size:
+        cache.put(key, audio)
+    return audio
+
+
+class ChunkSynthesisError(Exception):
+    """Raised by iter_chunk_audio when a chunk fails; carries the chunk index."""
+
+    def __init__(self, index, error):
+        super().__init__(str(error))
+        self.index = index
+
+
+def _init_synthesis_worker(torch_threads):
+    """Process-pool initializer: cap torch threads so workers don't oversubscribe the CPU."""
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except Exception:
+        pass
+
+
+def _synthesize_in_worker(task):
+    """Process-pool task. Each worker process keeps its own per-language pipelines."""
+    return run_pipeline_batch(*task)
+
+
+_process_pool = None
+_process_pool_config = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool(workers, torch_threads):
+    """Return the shared synthesis process pool, (re)creating it if the configuration changed.
+
+    The pool outlives individual jobs so workers keep their loaded models.
+    """
+    global _process_pool, _process_pool_config
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_config != (workers, torch_threads):
+            if _process_pool is not None:
+                _process_pool.terminate()
+            ctx = multiprocessing.get_context('spawn')
+            _process_pool = ctx.Pool(workers, initializer=_init_synthesis_worker, initargs=(torch_threads,))
+            _process_pool_config = (workers, torch_threads)
+        return _process_pool
+
+
+def shutdown_process_pool():
+    """Terminate the synthesis process pool immediately, abandoning running tasks."""
+    global _process_pool, _process_pool_config
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.terminate()
+            _process_pool = None
+            _process_pool_config = None
+
+
+def _iter_chunk_groups(text_chunks, voice, speed, cache, batch_size):
+    """Route chunks and group consecutive cache misses that share a voice and pipeline.
+
+    Yields (entries, task). entries is a list of (chunk_index, cache_key, cached_audio);
+    task is None for a cache hit, else the run_pipeline_batch arguments for the group.
+    """
+    entries, texts, route = [], [], None
+    for idx, chunk in enumerate(text_chunks):
+        try:
+            processed_chunk, chunk_voice, pipeline_lang = prepare_chunk(chunk, voice)
+        except Exception as e:
+            raise ChunkSynthesisError(idx, e) from e
+        key = cache.key(processed_chunk, chunk_voice, pipeline_lang, speed) if cache is not None else None
+        cached = cache.get(key) if key is not None else None
+
+        if entries and (cached is not None or route != (chunk_voice, pipeline_lang) or len(entries) >= batch_size):
+            yield entries, (texts, route[0], route[1], speed)
+            entries, texts = [], []
+        if cached is not None:
+            yield [(idx, key, cached)], None
+            continue
+        entries.append((idx, key, None))
+        texts.append(processed_chunk)
+        route = (chunk_voice, pipeline_lang)
+
+    if entries:
+        yield entries, (texts, route[0], route[1], speed)
+
+
+def _store_group(entries, audios, cache):
+    """Save freshly synthesized group audio to the chunk cache."""
+    if cache is None:
+        return
+    for (_, key, _), audio in zip(entries, audios):
+        if key is not None and audio.size:
+            cache.put(key, audio)
+
+
+class StageMonitor:
+    """Busy time and item count of one stage in the staged synthesis pipeline."""
+
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.items = 0
+        self.started = time.perf_counter()
+        self.stopped = None
+
+    def as_dict(self):
+        wall = (self.stopped or time.perf_counter()) - self.started
+        return {
+            'items': self.items,
+            'busy': round(self.busy, 3),
+            'utilization': round(self.busy / wall, 3) if wall > 0 else 0.0,
+        }
+
+
+def _iter_chunk_audio_staged(text_chunks, voice, speed, cancel_event, cache, stage_stats, batch_size=1,
+                             checkpoint=None):
+    """Staged variant of iter_chunk_audio: front-end, inference and output overlap.
+
+    A front-end thread routes chunks, checks the cache and phonemizes each
+    group of up to batch_size cache misses (see _iter_chunk_groups) in one
+    pass; an inference thread runs the model chunk by chunk; the consumer of
+    this generator is the output stage. Stages hand work over through bounded
+    queues, so the front-end runs at most STAGE_QUEUE_SIZE groups ahead.
+    Closing the generator stops both threads and waits for them, so the
+    caller may release the text source afterwards.
+    """
+    prepared_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    audio_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    stop = threading.Event()
+    done = object()
+    monitors = {name: StageMonitor(name) for name in ('front-end', 'inference', 'output')}
+
+    def put(q, item):
+        while not (stop.is_set() or cancel_event.is_set()):
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not (stop.is_set() or cancel_event.is_set()):
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return done
+
+    def front_end():
+        monitor = monitors['front-end']
+        groups = _iter_chunk_groups(text_chunks, voice, speed, cache, batch_size)
+        try:
+            while True:
+                if checkpoint is not None:
+                    checkpoint()
+                    if stop.is_set():
+                        return
+                start = time.perf_counter()
+                entries = None
+                try:
+                    entries, task = next(groups, (None, None))
+                    if entries is None:
+                        return
+                    payload = None
+                    if task is not None:
+                        texts, chunk_voice, pipeline_lang, _ = task
+                        pipeline = get_pipeline_for_lang(pipeline_lang)
+                        payload = (chunk_voice, pipeline_lang, phonemize_group(pipeline, pipeline_lang, texts))
+                except ChunkSynthesisError as e:
+                    put(prepared_queue, ([(e.index, None, None)], e.__cause__ or e))
+                    return
+                except Exception as e:
+                    put(prepared_queue, (entries, e))
+                    return
+                monitor.busy += time.perf_counter() - start
+                monitor.items += len(entries)
+                if not put(prepared_queue, (entries, payload)):
+                    return
+        finally:
+            monitor.stopped = time.perf_counter()
+            put(prepared_queue, done)
+
+    def inference():
+        monitor = monitors['inference']
+        try:
+            while True:
+                item = get(prepared_queue)
+                if item is done:
+                    return
+                entries, payload = item
+                if isinstance(payload, Exception):
+                    put(audio_queue, (entries[0][0], payload))
+                    return
+                if payload is None:
+                    if not put(audio_queue, (entries[0][0], entries[0][2])):
+                        return
+                    continue
+                chunk_voice, pipeline_lang, prepared = payload
+                for (idx, key, _), pieces in zip(entries, prepared):
+                    if checkpoint is not None:
+                        checkpoint()
+                    if stop.is_set() or cancel_event.is_set():
+                        return
+                    start = time.perf_counter()
+                    try:
+                        audio = synthesize_prepared(get_pipeline_for_lang(pipeline_lang), pieces, chunk_voice, speed)
+                        _store_group([(idx, key, None)], [audio], cache)
+                    except Exception as e:
+                        put(audio_queue, (idx, e))
+                        return
+                    monitor.busy += time.perf_counter() - start
+                    monitor.items += 1
+                    if not put(audio_queue, (idx, audio)):
+                        return
+        finally:
+            monitor.stopped = time.perf_counter()
+            put(audio_queue, done)
+
+    threads = [threading.Thread(target=front_end, daemon=True), threading.Thread(target=inference, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    output = monitors['output']
+    try:
+        while True:
+            item = get(audio_queue)
+            if item is done or cancel_event.is_set():
+                return
+            idx, audio = item
+            if isinstance(audio, Exception):
+                raise ChunkSynthesisError(idx, audio) from audio
+            start = time.perf_counter()
+            yield idx, audio
+            output.busy += time.perf_counter() - start
+            output.items += 1
+    finally:
+        stop.set()
+        output.stopped = time.perf_counter()
+        # The front-end may be reading text_chunks (e.g. a memory-mapped file the
+        # caller closes next): don't return until both stages have let go of it
+        for thread in threads:
+            thread.join()
+        if stage_stats is not None:
+            stage_stats.update({name: monitor.as_dict() for name, monitor in monitors.items()})
+
+
+def format_stage_stats(stage_stats):
+    """One-line utilization summary, e.g. 'front-end 12% · inference 95% · output 4%'."""
+    return ' · '.join(f"{name} {int(stats['utilization'] * 100)}%" for name, stats in stage_stats.items())
+
+
+def iter_chunk_audio(text_chunks, voice, speed, cancel_event, cache=None, workers=0, torch_threads=1, batch_size=1,
+                     staged=False, stage_stats=None, checkpoint=None):
+    """Yield (chunk_index, audio) for every chunk, in order.
+
+    Up to batch_size consecutive chunks that share a voice and pipeline are
+    synthesized in one pipeline call. With workers > 0 these groups are fanned
+    out to a process pool (at most two tasks in flight per worker) and
+    reassembled in the original order; several jobs may share the pool. Without workers, staged=True overlaps
+    the text front-end with inference (see _iter_chunk_audio_staged) and fills
+    stage_stats with per-stage utilization. checkpoint, if given, may block
+    (see JobScheduler.checkpoint); in-process it is called before each chunk
+    (see run_pipeline_batch for the G2P cache off). With workers it is called
+    before each group is sent to the pool, and groups already sent keep
+    running while paused, so a pause takes effect only once those in-flight
+    tasks are done. Stops quietly once cancel_event is set, terminating busy
+    workers.
+    """
+    if workers <= 0 and staged:
+        yield from _iter_chunk_audio_staged(text_chunks, voice, speed, cancel_event, cache, stage_stats,
+                                            max(1, batch_size), checkpoint)
+        return
+
+    groups = _iter_chunk_groups(text_chunks, voice, speed, cache, max(1, batch_size))
+
+    if workers <= 0:
+        for entries, task in groups:
+            if cancel_event.is_set():
+                return
+            if task is None:
+                audios = [entries[0][2]]
+            else:
+                try:
+                    audios = run_pipeline_batch(*task, checkpoint=checkpoint)
+                except Exception as e:
+                    raise ChunkSynthesisError(entries[0][0], e) from e
+                _store_group(entries, audios, cache)
+            for (idx, _, _), audio in zip(entries, audios):
+                yield idx, audio
+        return
+
+    pool = get_process_pool(workers, torch_threads)
+    pending = deque()  # (entries, AsyncResult or None for a cache hit), in chunk order
+    exhausted = False
+    in_flight = 0
+    finished = False
+    try:
+        while True:
+            # Keep the pool busy without queueing the whole document
+            while not exhausted and in_flight < workers * 2 and len(pending) < workers * 4:
+                try:
+                    entries, task = next(groups)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if task is None:
+                    pending.append((entries, None))
+                else:
+                    if checkpoint is not None:
+                        checkpoint()
+                    pending.append((entries, pool.apply_async(_synthesize_in_worker, (task,))))
+                    in_flight += 1
+
+            if not pending:
+                finished = True
+                return
+
+            entries, result = pending.popleft()
+            if result is None:
+                audios = [entries[0][2]]
+            else:
+                while not result.ready():
+                    if cancel_event.is_set():
+                        return
+                    result.wait(0.1)
+                in_flight -= 1
+                try:
+                    audios = result.get()
+                except Exception as e:
+                    raise ChunkSynthesisError(entries[0][0], e) from e
+                _store_group(entries, audios, cache)
+
+            for (idx, _, _), audio in zip(entries, audios):
+                if cancel_event.is_set():
+                    return
+                yield idx, audio
+    finally:
+        if not finished and in_flight and cancel_event.is_set():
+            # Cancelled mid-job: don't let stale tasks hog the workers. After an error
+            # the pool is left alone, since other jobs (batch files) may be using it.
+            shutdown_process_pool()
+
+
+class JobCheckpoint:
+    """Per-chunk checkpoints that let an interrupted generation resume.
+
+    A directory named after the job (text, voice, speed and chunking) holds
+    manifest.json, written once, and completed.jsonl, which gets one line per
+    finished chunk. The audio itself is not copied: a line records the
+    chunk's key in the chunk cache, where synthesis already stored it, and
+    only with the cache disabled is the chunk saved as a float WAV file.
+    Starting the same job again finds the directory and only the missing
+    chunks (including any the cache has evicted since) need synthesizing.
+    """
+
+    def __init__(self, temp_dir, text, voice, speed, text_chunks, cache=None):
+        self.manifest = {
+            'text_hash': hashlib.sha256(text.encode('utf-8')).hexdigest(),
+            'chunks_hash': hashlib.sha256(json.dumps(text_chunks).encode('utf-8')).hexdigest(),
+            'voice': voice,
+            'speed': round(float(speed), 3),
+            'chunks': len(text_chunks),
+        }
+        job_hash = hashlib.sha256(json.dumps(self.manifest, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.directory = os.path.join(temp_dir, job_hash)
+        self.text_chunks = text_chunks
+        self.voice = voice
+        self.speed = speed
+        self.cache = cache
+        self.completed = {}  # chunk index -> cache key, 'wav' or 'empty'
+        self._log = None
+
+        try:
+            with open(self._manifest_path(), 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = None
+        if saved != self.manifest:
+            return
+        try:
+            with open(self._log_path(), 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            lines = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+                idx, stored = entry['chunk'], entry['stored']
+            except (ValueError, KeyError, TypeError):
+                continue  # a line cut short by the interruption
+            # Only trust chunks whose audio is still on disk
+            if stored == 'empty' or os.path.exists(self._audio_path(idx, stored)):
+                self.completed[idx] = stored
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _log_path(self):
+        return os.path.join(self.directory, 'completed.jsonl')
+
+    def _audio_path(self, idx, stored):
+        if stored == 'wav':
+            return os.path.join(self.directory, f'chunk_{idx:06d}.wav')
+        return self.cache._path(stored) if self.cache is not None else ''
+
+    def load(self, idx):
+        """Return a completed chunk's audio, or None if it has gone missing since the job started."""
+        stored = self.completed[idx]
+        if stored == 'empty':
+            return np.zeros(0, dtype=np.float32)
+        if stored == 'wav':
+            try:
+                audio, _ = sf.read(self._audio_path(idx, stored), dtype='float32')
+            except Exception:
+                return None
+            return audio
+        return self.cache.get(stored)
+
+    @timed('checkpoint')
+    def save(self, idx, audio):
+        """Record one finished chunk: a line in completed.jsonl, plus a WAV file only without the chunk cache."""
+        if self._log is None:
+            os.makedirs(self.directory, exist_ok=True)
+            if not os.path.exists(self._manifest_path()):
+                with open(f'{self._manifest_path()}.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(self.manifest, f)
+                os.replace(f'{self._manifest_path()}.tmp', self._manifest_path())
+            self._log = open(self._log_path(), 'a', encoding='utf-8')
+        if not np.asarray(audio).size:
+            stored = 'empty'
+        elif self.cache is not None:
+            # iter_chunk_audio has already put the chunk in the cache under this key
+            processed_chunk, chunk_voice, pipeline_lang = prepare_chunk(self.text_chunks[idx], self.voice)
+            stored = self.cache.key(processed_chunk, chunk_voice, pipeline_lang, self.speed)
+        else:
+            stored = 'wav'
+            path = self._audio_path(idx, stored)
+            sf.write(f'{path}.tmp', audio, SAMPLE_RATE, format='WAV', subtype='FLOAT')
+            os.replace(f'{path}.tmp', path)
+        self._log.write(json.dumps({'chunk': idx, 'stored': stored}) + '\n')
+        self._log.flush()
+        self.completed[idx] = stored
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def discard(self):
+        """Remove the checkpoints once the output file is complete."""
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def format_output_stats(path, frames, encode_seconds):
+    """Size and encode time of a finished output, e.g. '1.2 MB, 4.8x smaller than 16-bit WAV, encoded in 0.3s'."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return ''
+    parts = [f'{size / 1e6:.1f} MB' if size >= 1e6 else f'{size / 1e3:.0f} KB']
+    pcm_size = frames * 2 + 44
+    if size < pcm_size * 0.9:
+        parts.append(f'{pcm_size / size:.1f}x smaller than 16-bit WAV')
+    parts.append(f'encoded in {encode_seconds:.1f}s')
+    return ', '.join(parts)
+
+
+# GUI job priorities (lower runs first). A preview preempts a running
+# generation at its next chunk boundary; jobs of equal priority run in FIFO order.
+PRIORITY_PREVIEW = 0
+PRIORITY_GENERATE = 10
+
+
+class Job:
+    """One unit of GUI work: target(job) runs on its own thread when scheduled."""
+
+    def __init__(self, job_id, label, priority, target):
+        self.id = job_id
+        self.label = label
+        self.priority = priority
+        self.target = target
+        self.cancel_event = threading.Event()
+        self.state = 'queued'  # queued -> running <-> paused -> done
+        self.detail = ''
+        self.paused_seconds = 0.0
+        self._paused_at = None
+
+
+class JobScheduler:
+    """Priority queue of GUI jobs, replacing the single worker thread.
+
+    One job runs at a time, except that a queued job with a strictly higher
+    priority than everything running is started straight away. The job it
+    overtakes keeps its thread but waits in checkpoint() until the more urgent
+    work is done, then resumes where it left off. on_change is called (from
+    any thread) whenever a job is queued, starts, pauses, resumes or finishes.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self._cond = threading.Condition()
+        self._queued = []
+        self._running = []
+        self._next_id = 1
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def submit(self, label, priority, target):
+        """Queue target(job) and return the Job."""
+        with self._cond:
+            job = Job(self._next_id, label, priority, target)
+            self._next_id += 1
+            self._queued.append(job)
+            self._dispatch()
+        self._changed()
+        return job
+
+    def _dispatch(self):
+        # Caller holds the lock
+        while self._queued:
+            job = min(self._queued, key=lambda j: (j.priority, j.id))
+            if self._running and job.priority >= min(j.priority for j in self._running):
+                return
+            self._queued.remove(job)
+            self._running.append(job)
+            job.state = 'running'
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        try:
+            job.target(job)
+        finally:
+            with self._cond:
+                self._running.remove(job)
+                job.state = 'done'
+                self._dispatch()
+                self._cond.notify_all()
+            self._changed()
+
+    def _outranked(self, job):
+        return any(j.priority < job.priority for j in self._running + self._queued)
+
+    def checkpoint(self, job):
+        """Block while more urgent jobs are queued or running; call at chunk boundaries.
+
+        Safe to call from several threads of the same job at once.
+        """
+        with self._cond:
+            if not self._outranked(job) or job.cancel_event.is_set():
+                return
+            if job.state != 'paused':
+                job.state = 'paused'
+                job._paused_at = time.time()
+                paused = True
+            else:
+                paused = False
+        if paused:
+            self._changed()
+
+        with self._cond:
+            while self._outranked(job) and not job.cancel_event.is_set():
+                self._cond.wait(0.5)
+            resumed = job.state == 'paused'
+            if resumed:
+                job.state = 'running'
+                job.paused_seconds += time.time() - job._paused_at
+        if resumed:
+            self._changed()
+
+    def cancel(self, job=None):
+        """Cancel a job (default: the most urgent running one); queued jobs are dropped. Returns the job."""
+        with self._cond:
+            if job is None:
+                if not self._running:
+                    return None
+                job = min(self._running, key=lambda j: (j.priority, -j.id))
+            job.cancel_event.set()
+            if job in self._queued:
+                self._queued.remove(job)
+                job.state = 'done'
+            self._cond.notify_all()
+        self._changed()
+        return job
+
+    def jobs(self):
+        """Snapshot of unfinished jobs: running/paused first, then the queue in run order."""
+        with self._cond:
+            running = sorted(self._running, key=lambda j: (j.priority, j.id))
+            return running + sorted(self._queued, key=lambda j: (j.priority, j.id))
+
+
 class TTSApp:
     def __init__(self, root):
         self.root = root
@@ -250,23 +2678,42 @@ class TTSApp:
         # Configure modern theme
         self._setup_styles()
 
+        # History file path (the layout fills the history list on build)
+        self.history_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.tts_history.json')
+        self.history_store = HistoryStore(HISTORY_DB_PATH, legacy_json=self.history_file)
+        self.history = []  # entries shown in the history listbox, newest first
+        self.history_exhausted = True
+
         # Build UI - two-pane layout
         self._build_responsive_layout()
         # Sidebar visibility state
         self.sidebar_visible = True
 
         # Initialize state
-        self.worker_thread = None
-        self.cancel_event = threading.Event()
+        self.scheduler = JobScheduler(on_change=lambda: self.root.after(0, self._refresh_jobs))
+        self.job_rows = []  # Job shown on each row of the jobs listbox
         self.is_dark_mode = False
 
-        # History file path
-        self.history_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.tts_history.json')
-        self.history = self._load_history()
-
         # Generation timing
         self.gen_start_time = None
         self.gen_total_chunks = 0
+        # Stage timings of the last finished job, for the details window
+        self.last_job_metrics = None
+        # File whose read-only excerpt the editor shows, and the text it replaced
+        self.excerpt_path = None
+        self.editor_backup = None
+        # Pending debounced recount of the editor statistics, and a counter to drop stale results
+        self.stats_after_id = None
+        self.stats_generation = 0
+
+        # Model warm-up state: (voice, lang) pairs already warmed, and the one in progress
+        self.warmed = set()
+        self.warming = None
+        if WARMUP_ON_START:
+            # Wait until the window has been drawn before starting
+            root.after_idle(self._start_warmup)
+        elif ENGINE_IMPORT == 'background':
+            root.after_idle(lambda: threading.Thread(target=self._preload_engine, daemon=True).start())
 
         # Set initial focus
         self.text_box.focus_set()
@@ -490,6 +2937,30 @@ class TTSApp:
         )
         browse_btn.pack(fill='x', pady=(0, 12))
 
+        # --- Output Format Section ---
+        ttk.Label(sidebar, text='Format', style='Heading.TLabel').pack(anchor='w', pady=(0, 6))
+        self.format_var = tk.StringVar(value=DEFAULT_OUTPUT_FORMAT)
+        ttk.Combobox(
+            sidebar,
+            textvariable=self.format_var,
+            values=list(OUTPUT_FORMATS),
+            state='readonly',
+            style='Modern.TCombobox',
+            width=28
+        ).pack(fill='x', pady=(0, 12))
+
+        ttk.Label(sidebar, text='Sample Rate', style='Heading.TLabel').pack(anchor='w', pady=(0, 6))
+        rate_options = [f'{rate} Hz' + (' (native)' if rate == SAMPLE_RATE else '') for rate in OUTPUT_SAMPLE_RATES]
+        self.sample_rate_var = tk.StringVar(value=rate_options[OUTPUT_SAMPLE_RATES.index(SAMPLE_RATE)])
+        ttk.Combobox(
+            sidebar,
+            textvariable=self.sample_rate_var,
+            values=rate_options,
+            state='readonly',
+            style='Modern.TCombobox',
+            width=28
+        ).pack(fill='x', pady=(0, 12))
+
         # --- Voice Selection Section (Dropdown) ---
         ttk.Label(sidebar, text='Voice', style='Heading.TLabel').pack(anchor='w', pady=(12, 6))
 
@@ -508,6 +2979,7 @@ class TTSApp:
         self.voice_dropdown.pack(fill='x', pady=(0, 12))
         # Set default display value
         self.voice_dropdown.set(VOICE_NAMES['af_heart'])
+        self.voice_dropdown.bind('<<ComboboxSelected>>', self._on_voice_selected)
 
         # --- Speed Section (Right after Voice) ---
         ttk.Label(sidebar, text='Speed', style='Heading.TLabel').pack(anchor='w', pady=(12, 6))
@@ -521,6 +2993,7 @@ class TTSApp:
         self.speed_label = ttk.Label(speed_frame, text='1.0x', style='Heading.TLabel', foreground=COLORS['primary'], width=4)
         self.speed_label.pack(side='left', padx=(8, 0))
         self.speed_var.trace_add('write', lambda *_: self._update_speed_label())
+        self.speed_var.trace_add('write', lambda *_: self._on_text_modified())
 
         # --- Progress Bar Section ---
         ttk.Label(sidebar, text='Progress', style='Heading.TLabel').pack(anchor='w', pady=(12, 4))
@@ -529,24 +3002,50 @@ class TTSApp:
         self.time_var = tk.StringVar(value='--:-- / --:--')
         ttk.Label(sidebar, textvariable=self.time_var, style='Muted.TLabel').pack(anchor='w')
 
+        # --- Jobs Section ---
+        ttk.Label(sidebar, text='Jobs', style='Heading.TLabel').pack(anchor='w', pady=(12, 4))
+        self.jobs_listbox = tk.Listbox(
+            sidebar,
+            height=3,
+            bg=COLORS['surface'],
+            fg=COLORS['text_primary'],
+            borderwidth=1,
+            relief='solid',
+            font=FONTS['small'],
+            exportselection=False
+        )
+        self.jobs_listbox.pack(fill='x', pady=(0, 4))
+        self.jobs_listbox.insert('end', 'No jobs')
+
         # --- History Section ---
-        ttk.Label(sidebar, text='Recent Files', style='Heading.TLabel').pack(anchor='w', pady=(12, 4))
+        ttk.Label(sidebar, text='History', style='Heading.TLabel').pack(anchor='w', pady=(12, 4))
         hist_frame = ttk.Frame(sidebar, style='Header.TFrame')
         hist_frame.pack(fill='both', expand=False, pady=(0, 12), padx=(0, 0))
         hist_frame.columnconfigure(0, weight=1)
-        hist_frame.rowconfigure(0, weight=0)
+        hist_frame.rowconfigure(1, weight=0)
+
+        # Search by voice, file name or date (YYYY-MM-DD prefix)
+        self.history_search_var = tk.StringVar()
+        ttk.Entry(hist_frame, textvariable=self.history_search_var).grid(row=0, column=0, columnspan=2,
+                                                                         sticky='ew', pady=(0, 4))
+        self.history_search_var.trace_add('write', lambda *_: self._update_history_display())
 
         self.history_listbox = tk.Listbox(
             hist_frame,
-            height=4,
+            height=6,
             bg=COLORS['surface'],
             fg=COLORS['text_primary'],
             borderwidth=1,
             relief='solid',
-            font=FONTS['small']
+            font=FONTS['small'],
+            exportselection=False
         )
-        self.history_listbox.grid(row=0, column=0, sticky='nsew')
+        self.history_listbox.grid(row=1, column=0, sticky='nsew')
+        self.history_scrollbar = ttk.Scrollbar(hist_frame, orient='vertical', command=self.history_listbox.yview)
+        self.history_scrollbar.grid(row=1, column=1, sticky='ns')
+        self.history_listbox.config(yscrollcommand=self._on_history_scroll)
         self.history_listbox.bind('<Double-Button-1>', self._on_history_play)
+        self.history_listbox.bind('<<ListboxSelect>>', self._on_history_select)
 
         # --- Status Section (in scrollable area) ---
         status_frame = ttk.Frame(sidebar, style='Header.TFrame')
@@ -571,6 +3070,13 @@ class TTSApp:
         )
         path_label.pack(anchor='w', pady=(4, 0))
 
+        ttk.Button(
+            status_frame,
+            text='📊 Stage timings',
+            style='Secondary.TButton',
+            command=self._show_stage_timings
+        ).pack(anchor='w', pady=(8, 0))
+
         # --- Action Buttons Section (FIXED at bottom) ---
         button_frame = ttk.Frame(sidebar_container, style='Header.TFrame')
         button_frame.grid(row=1, column=0, sticky='ew', pady=(12, 0), padx=12)
@@ -584,6 +3090,13 @@ class TTSApp:
         )
         self.generate_btn.pack(fill='x', pady=(0, 8), padx=0)
 
+        ttk.Button(
+            button_frame,
+            text='📄 Synthesize from file…',
+            style='Secondary.TButton',
+            command=self.start_file_generation
+        ).pack(fill='x', pady=(0, 8), padx=0)
+
         # Preview button
         preview_btn = ttk.Button(
             button_frame,
@@ -625,6 +3138,10 @@ class TTSApp:
         )
         header_label.pack(side='left', anchor='w')
 
+        # Model warm-up indicator
+        self.model_status_var = tk.StringVar(value='')
+        ttk.Label(header_frame, textvariable=self.model_status_var, style='Muted.TLabel').pack(side='right', anchor='e')
+
         # Text editor container (main focus of the UI)
         text_container = ttk.Frame(main_pane, style='Card.TFrame')
         text_container.grid(row=1, column=0, columnspan=2, sticky='nsew', padx=16, pady=(0, 12))
@@ -657,6 +3174,7 @@ class TTSApp:
         # Setup path preview updates
         self.filename_var.trace_add('write', lambda *_: self._update_path_preview())
         self.save_dir_var.trace_add('write', lambda *_: self._update_path_preview())
+        self.format_var.trace_add('write', lambda *_: self._update_path_preview())
 
         # Character counter
         self.char_count_var = tk.StringVar(value='0 characters')
@@ -669,37 +3187,22 @@ class TTSApp:
         status_preview.grid(row=3, column=0, columnspan=2, sticky='w', padx=16, pady=(0, 0))
 
         self._update_path_preview()
+        self._update_history_display()
         self.main_pane = main_pane
 
-    def _load_history(self):
-        """Load generation history from JSON file."""
+    def _add_to_history(self, filename, voice, word_count, path=None, lang_mix=None, audio_seconds=None,
+                        wall_seconds=None):
+        """Append a finished job to the history store and show it at the top of the list."""
+        path = path or os.path.join(self.save_dir_var.get(), filename)
         try:
-            if os.path.exists(self.history_file):
-                with open(self.history_file, 'r') as f:
-                    return json.load(f).get('history', [])
-        except Exception:
-            pass
-        return []
-
-    def _save_history(self):
-        """Save generation history to JSON file."""
-        try:
-            with open(self.history_file, 'w') as f:
-                json.dump({'history': self.history[-20:]}, f, indent=2)
-        except Exception:
-            pass
-
-    def _add_to_history(self, filename, voice, word_count):
-        """Add a generated file to history."""
-        entry = {
-            'timestamp': datetime.now().isoformat(),
-            'filename': filename,
-            'voice': voice,
-            'word_count': word_count,
-            'path': os.path.join(self.save_dir_var.get(), filename)
-        }
-        self.history.append(entry)
-        self._save_history()
+            size_bytes = os.path.getsize(path)
+        except OSError:
+            size_bytes = None
+        self.history_store.add(
+            filename=filename, path=path, voice=voice, lang_mix=lang_mix, word_count=word_count,
+            audio_seconds=audio_seconds, wall_seconds=wall_seconds, size_bytes=size_bytes,
+            rtf=round(wall_seconds / audio_seconds, 4) if audio_seconds and wall_seconds else None
+        )
         self._update_history_display()
 
     def _toggle_theme(self):
@@ -724,50 +3227,71 @@ class TTSApp:
             pass
 
     def _update_history_display(self):
-        """Update the history list display in sidebar."""
-        try:
-            # Clear old history items
-            if hasattr(self, 'history_listbox'):
-                self.history_listbox.delete(0, tk.END)
-                # Add recent files
-                for item in reversed(self.history[-10:]):
-                    voice_name = self._get_voice_friendly_name(item['voice'])
-                    display = f"{os.path.basename(item['filename'])} ({voice_name.split('(')[0].strip()})"
-                    self.history_listbox.insert(0, display)
-        except Exception:
-            pass
+        """Show the first page of history matching the search box."""
+        if not hasattr(self, 'history_listbox'):
+            return
+        self.history = []
+        self.history_exhausted = False
+        self.history_listbox.delete(0, tk.END)
+        self._load_more_history()
+
+    def _load_more_history(self):
+        """Append the next page of history to the listbox."""
+        if self.history_exhausted:
+            return
+        before_id = self.history[-1]['id'] if self.history else None
+        entries = self.history_store.page(self.history_search_var.get(), before_id)
+        self.history_exhausted = len(entries) < HISTORY_PAGE_SIZE
+        for item in entries:
+            voice_name = self._get_voice_friendly_name(item['voice'] or '').split('(')[0].strip()
+            display = f"{os.path.basename(item['filename'] or '')} ({voice_name})"
+            if item['audio_seconds']:
+                display += f" · {format_duration(item['audio_seconds'])}"
+            self.history_listbox.insert(tk.END, display)
+        self.history += entries
+
+    def _on_history_scroll(self, first, last):
+        """Keep the scrollbar in step and fetch the next page once the end of the list is visible."""
+        self.history_scrollbar.set(first, last)
+        if float(last) >= 1.0 and not self.history_exhausted:
+            self.root.after_idle(self._load_more_history)
+
+    def _on_history_select(self, event=None):
+        """Show the selected job's details in the status line."""
+        selection = self.history_listbox.curselection()
+        if not selection or selection[0] >= len(self.history):
+            return
+        item = self.history[selection[0]]
+        parts = [item['timestamp'][:16].replace('T', ' ')]
+        if item['word_count'] is not None:
+            parts.append(f"{item['word_count']:,} words")
+        if item['lang_mix']:
+            parts.append(' / '.join(f'{lang} {share:.0%}' for lang, share in
+                                    sorted(item['lang_mix'].items(), key=lambda pair: -pair[1])))
+        if item['audio_seconds']:
+            parts.append(f"{format_duration(item['audio_seconds'])} audio")
+        if item['wall_seconds']:
+            parts.append(f"{format_duration(item['wall_seconds'])} wall")
+        if item['rtf']:
+            parts.append(f"RTF {item['rtf']:.2f}")
+        if item['size_bytes']:
+            size = item['size_bytes']
+            parts.append(f'{size / 1e6:.1f} MB' if size >= 1e6 else f'{size / 1e3:.0f} KB')
+        self.status_var.set(f"📜 {item['filename']}: {', '.join(parts)}")
 
     def _play_audio_preview(self, audio_path):
-        """Attempt to play audio file (requires winsound on Windows or pyaudio)."""
-        try:
-            import platform
-            if platform.system() == 'Windows':
-                import winsound
-                winsound.PlaySound(audio_path, winsound.SND_FILENAME)
-            else:
-                # On Linux/Mac, try using subprocess with available player
-                import subprocess
-                subprocess.run(['afplay', audio_path] if platform.system() == 'Darwin' else ['aplay', audio_path], check=False)
-        except Exception as e:
-            messagebox.showinfo('Preview', 'Audio preview not available on this system.')
+        """Play an audio file on a background thread so the UI stays responsive."""
+        def run():
+            try:
+                play_audio_file(audio_path)
+            except Exception:
+                self.root.after(0, lambda: messagebox.showinfo('Preview', 'Audio preview not available on this system.'))
+
+        threading.Thread(target=run, daemon=True).start()
 
     def _get_voice_code(self, voice_input):
         """Convert voice code or friendly name to voice code."""
-        voice_input = voice_input.strip().lower()
-
-        # Check if it's already a voice code
-        if voice_input in VOICE_LIST:
-            return voice_input
-
-        # Check friendly names mapping - find the code for this friendly name
-        for code, friendly in VOICE_NAMES.items():
-            if voice_input == friendly.lower():
-                return code
-            # Also check if the voice name (without locale) matches
-            if voice_input in friendly.lower():
-                return code
-
-        return voice_input  # Return as-is if not found
+        return get_voice_code(voice_input)
 
     def _get_voice_friendly_name(self, voice_code):
         """Get friendly name for a voice code."""
@@ -791,8 +3315,7 @@ class TTSApp:
         try:
             sel = self.history_listbox.curselection()
             if sel:
-                # Get the history index (reversed because we display in reverse)
-                idx = len(self.history) - 1 - sel[0]
+                idx = sel[0]
                 if 0 <= idx < len(self.history):
                     file_path = self.history[idx]['path']
                     if os.path.exists(file_path):
@@ -802,6 +3325,56 @@ class TTSApp:
         except Exception as e:
             messagebox.showerror('Error', f'Could not play file: {e}')
 
+    def _preload_engine(self):
+        """Import the engine off the UI thread; errors surface again on first synthesis."""
+        try:
+            load_engine()
+        except Exception:
+            pass
+
+    def _on_voice_selected(self, event=None):
+        """Re-warm the model when the newly selected voice needs another pipeline."""
+        if WARMUP_ON_START:
+            self._start_warmup()
+
+    def _start_warmup(self):
+        """Load the selected voice's pipeline and voice pack on a background thread."""
+        voice = self._get_voice_code(self.voice_var.get())
+        lang = get_optimal_voice_for_language(voice, voice_language(voice))[1]
+        target = (voice, lang)
+        if target == self.warming:
+            return
+        if target in self.warmed and lang in pipeline_manager.resident():
+            self.model_status_var.set('● Model ready')
+            return
+        self.warming = target
+        self.model_status_var.set('◌ Loading model...')
+        threading.Thread(target=self._warmup_worker, args=(voice, lang), daemon=True).start()
+
+    def _warmup_worker(self, voice, lang):
+        """Construct the pipeline and run a tiny dummy synthesis so weights and voice are resident."""
+        try:
+            init_device()
+            pipeline = get_pipeline_for_lang(lang)
+            with pipeline_manager.lock(pipeline, 'g2p'), pipeline_manager.lock(pipeline, 'model'):
+                for _ in pipeline(WARMUP_TEXT.get(lang, 'Hello.'), voice=voice, speed=1.0):
+                    pass
+        except Exception as e:
+            def failed(e_msg=str(e)):
+                if self.warming == (voice, lang):
+                    self.warming = None
+                    self.model_status_var.set(f'⚠️ Warm-up failed: {e_msg}')
+            self.root.after(0, failed)
+            return
+
+        def ready():
+            self.warmed.add((voice, lang))
+            # Only report if the user hasn't switched to a voice that is still loading
+            if self.warming == (voice, lang):
+                self.warming = None
+                self.model_status_var.set('● Model ready')
+        self.root.after(0, ready)
+
     def browse_directory(self):
         """Open directory picker and set save directory."""
         directory = filedialog.askdirectory(initialdir=self.save_dir_var.get())
@@ -815,204 +3388,233 @@ class TTSApp:
         if not filename:
             preview = '📁 Enter a filename to see the save path'
         else:
-            preview_name = filename if filename.lower().endswith('.wav') else f'{filename}.wav'
-            full_path = os.path.join(save_dir, preview_name)
+            full_path = os.path.join(save_dir, self._output_filename(filename))
             preview = f'📁 Will save to: {full_path}'
         self.output_path_var.set(preview)
 
+    def _output_filename(self, filename):
+        """filename with the selected format's extension (replacing any audio extension typed)."""
+        extension = OUTPUT_FORMATS[self.format_var.get()][0]
+        stem, typed = os.path.splitext(filename)
+        if typed.lower().lstrip('.') in {ext for ext, _, _ in OUTPUT_FORMATS.values()}:
+            filename = stem
+        return f'{filename}.{extension}'
+
     def _on_text_modified(self, event=None):
-        # Reset modified flag and update character count
+        """Reset the modified flag and schedule a recount once edits pause (see _count_text)."""
         try:
             self.text_box.edit_modified(False)
         except Exception:
             pass
+        if self.stats_after_id is not None:
+            self.root.after_cancel(self.stats_after_id)
+        self.stats_after_id = self.root.after(EDITOR_STATS_DELAY_MS, self._count_text)
+
+    def _count_text(self):
+        """Snapshot the editor and count it on a background thread, so typing never waits on a recount."""
+        self.stats_after_id = None
+        if self.excerpt_path is not None:
+            return  # the counter shows the file's size instead
+        self.stats_generation += 1
+        generation = self.stats_generation
         text = self.text_box.get('1.0', 'end-1c')
-        chars = len(text)
-        words = len(text.split()) if text.strip() else 0
-        self.char_count_var.set(f'{chars} characters • {words} words')
+        speed = self.speed_var.get()
+        # Predict synthesis time from the real-time factor of the last finished job
+        rtf = (self.last_job_metrics or {}).get('rtf')
+
+        def count():
+            stats = estimate_text_stats(text, speed)
+            self.root.after(0, lambda: self._show_text_stats(generation, stats, rtf))
+
+        threading.Thread(target=count, daemon=True).start()
+
+    def _show_text_stats(self, generation, stats, rtf):
+        if generation != self.stats_generation or self.excerpt_path is not None:
+            return  # the text changed again while this count ran
+        parts = [f"{stats['characters']:,} characters", f"{stats['words']:,} words"]
+        if stats['words']:
+            parts.append(f"~{stats['chunks']:,} chunks")
+            parts.append(f"≈{format_duration(stats['audio_seconds'])} audio")
+            if rtf:
+                parts.append(f"≈{format_duration(stats['audio_seconds'] * rtf)} to synthesize")
+        self.char_count_var.set(' • '.join(parts))
 
     def chunk_text(self, text: str, max_words: int = 50) -> list:
-        """Split text into chunks by word count (max 50 words per chunk for CPU efficiency)."""
-        words = text.split()
-        chunks = []
-        current_chunk = []
-
-        for word in words:
-            current_chunk.append(word)
-            if len(current_chunk) >= max_words:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = []
-
-        # Add remaining words
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-
-        return chunks if chunks else [text]
+        """Split text into chunks using the configured CHUNKER."""
+        return chunk_text(text, max_words=max_words)
 
     def detect_language_code(self, text: str) -> str:
         """Detect language from text and return appropriate language code for Kokoro."""
-        # Simple character-based language detection
-        text_lower = text.lower()
-
-        # Bengali/Bangla script (U+0980 - U+09FF)
-        bengali_chars = re.search(r'[\u0980-\u09FF]', text)
-        if bengali_chars:
-            return 'bn'  # Bengali language code
-
-        # Hindi/Devanagari script
-        hindi_chars = re.search(r'[\u0900-\u097F]', text)
-        if hindi_chars:
-            return 'hi'
-
-        # Chinese characters
-        chinese_chars = re.search(r'[\u4E00-\u9FFF\u3040-\u309F\u30A0-\u30FF]', text)
-        if chinese_chars:
-            # Check for Japanese hiragana/katakana vs Chinese hanzi
-            japanese_chars = re.search(r'[\u3040-\u309F\u30A0-\u30FF]', text)
-            if japanese_chars and len(japanese_chars.group()) > len(chinese_chars.group()) * 0.3:
-                return 'ja'
-            return 'zh'
-
-        # Japanese (if no Chinese but has hiragana/katakana)
-        japanese_chars = re.search(r'[\u3040-\u309F\u30A0-\u30FF]', text)
-        if japanese_chars:
-            return 'ja'
-
-        # Indonesian
-        if 'indonesia' in text_lower or re.search(r'\b(saya|anda|dia|mereka)\b', text_lower):
-            return 'id'
-
-        # Portuguese
-        if re.search(r'[\xE0\xE1\xE9\xED\xF3\xFA\xE3\xF5\xE7]', text):
-            # Portuguese has these accented characters
-            return 'pt'
-
-        # Finnish
-        if re.search(r'[\u00E4\u00F6\xE4\xF6]', text):  # ä ö
-            return 'fi'
-
-        # Default to English
-        return 'a'  # Kokoro default (English)
+        return detect_language_code(text)
 
     def transliterate_bengali_to_hindi(self, text: str) -> str:
         """Convert Bengali text to Hindi (Devanagari) for better voice synthesis."""
-        try:
-            from bangla import convert
-            # Try converting Bengali to phonetic representation
-            # This is a workaround since Kokoro doesn't have native Bengali support
-            return text
-        except Exception:
-            return text
+        return transliterate_bengali_to_hindi(text)
 
     def get_optimal_voice_for_language(self, voice_code: str, lang_code: str) -> tuple:
         """Ensure voice matches the language for better results."""
-        # Map voice prefixes to supported languages
-        voice_lang_map = {
-            'af_': ['a', 'en'],  # American Female - English
-            'am_': ['a', 'en'],  # American Male - English
-            'bf_': ['a', 'en'],  # British Female - English
-            'bm_': ['a', 'en'],  # British Male - English
-            'ef_': ['a', 'en'],  # European Female - English
-            'em_': ['a', 'en'],  # European Male - English
-            'ff_': ['fi'],       # Finnish Female
-            'hf_': ['hi'],       # Hindi Female
-            'hm_': ['hi'],       # Hindi Male
-            'if_': ['id'],       # Indonesian Female
-            'im_': ['id'],       # Indonesian Male
-            'jf_': ['ja'],       # Japanese Female
-            'jm_': ['ja'],       # Japanese Male
-            'pf_': ['pt'],       # Portuguese Female
-            'pm_': ['pt'],       # Portuguese Male
-            'zf_': ['zh'],       # Chinese Female
-        }
-
-        # Bengali (bn) should use Hindi voices since they're similar
-        if lang_code == 'bn':
-            lang_code = 'hi'  # Use Hindi pipeline for Bengali
-            # If user selected Hindi voices, keep them; otherwise default to Hindi voices
-            voice_prefix = voice_code[:3]
-            if voice_prefix in ['hf_', 'hm_']:
-                return voice_code, lang_code
-            else:
-                return 'hm_omega', lang_code  # Best Hindi voice for Bengali
-
-        # Check if current voice supports the detected language
-        voice_prefix = voice_code[:3]
-        if voice_prefix in voice_lang_map:
-            supported_langs = voice_lang_map[voice_prefix]
-            if lang_code in supported_langs:
-                return voice_code, lang_code
-
-        # If voice doesn't support language, find a compatible voice
-        # For now, default to English with English voice
-        if lang_code == 'a' or lang_code == 'en':
-            return 'af_heart', 'a'  # Default English
-
-        fallback_voice = DEFAULT_VOICE_BY_LANG.get(lang_code, 'af_heart')
-        fallback_lang = lang_code if lang_code != 'bn' else 'hi'
-        return fallback_voice, fallback_lang
+        return get_optimal_voice_for_language(voice_code, lang_code)
 
     def _get_pipeline_for_lang(self, lang_code: str):
         """Return cached Kokoro pipeline for a given language, creating if needed."""
-        global pipelines
-        target_lang = lang_code or 'a'
-        if target_lang not in pipelines:
-            pipelines[target_lang] = KPipeline(lang_code=target_lang)
-        return pipelines[target_lang]
+        return get_pipeline_for_lang(lang_code)
+
+    def _cache_snapshot(self):
+        """Current chunk and G2P cache counters, to diff against at the end of a job."""
+        return (chunk_cache.stats() if chunk_cache is not None else None,
+                g2p_cache.stats() if g2p_cache is not None else None)
+
+    def _cache_summary(self, start_stats):
+        """Describe cache activity since start_stats, e.g. 'cache 3 hit / 1 miss; g2p 80% hit, 0.4s saved'."""
+        parts = []
+        if chunk_cache is not None:
+            hits, misses = chunk_cache.stats()
+            parts.append(f'cache {hits - start_stats[0][0]} hit / {misses - start_stats[0][1]} miss')
+        if g2p_cache is not None:
+            hits, misses, saved = g2p_cache.stats()
+            hits -= start_stats[1][0]
+            misses -= start_stats[1][1]
+            if hits + misses:
+                parts.append(f'g2p {100 * hits // (hits + misses)}% hit, {saved - start_stats[1][2]:.1f}s saved')
+        return '; '.join(parts)
+
+
+    def _refresh_jobs(self):
+        """Redraw the jobs listbox from the scheduler (main thread)."""
+        icons = {'running': '▶', 'paused': '⏸', 'queued': '⏳'}
+        selected = self._selected_job()
+        self.job_rows = self.scheduler.jobs()
+        self.jobs_listbox.delete(0, 'end')
+        for row, job in enumerate(self.job_rows):
+            self.jobs_listbox.insert('end', f"{icons.get(job.state, '')} {job.label} {job.detail}".rstrip())
+            if job is selected:
+                self.jobs_listbox.selection_set(row)
+        if not self.job_rows:
+            self.jobs_listbox.insert('end', 'No jobs')
+        self.cancel_btn.config(state='normal' if self.job_rows else 'disabled')
+
+    def _selected_job(self):
+        selection = self.jobs_listbox.curselection()
+        if selection and selection[0] < len(self.job_rows):
+            return self.job_rows[selection[0]]
+        return None
+
+    def _output_settings(self):
+        """Validate the output fields; returns (filename, save_path, format, subtype, sample_rate) or None."""
+        filename = self.filename_var.get().strip()
+        if not filename:
+            messagebox.showwarning('No Filename', 'Please enter a filename for the output.')
+            return None
 
+        save_dir = self.save_dir_var.get().strip()
+        if not os.path.isdir(save_dir):
+            messagebox.showwarning('Invalid Directory', 'Please select a valid save directory.')
+            return None
+
+        filename = self._output_filename(filename)
+        _, audio_format, subtype = OUTPUT_FORMATS[self.format_var.get()]
+        sample_rate = int(self.sample_rate_var.get().split()[0])
+        if subtype == 'OPUS' and sample_rate not in OPUS_SAMPLE_RATES:
+            messagebox.showwarning('Unsupported Sample Rate',
+                                   f"Opus can't encode at {sample_rate} Hz. Choose one of: "
+                                   f"{', '.join(str(rate) for rate in OPUS_SAMPLE_RATES)} Hz.")
+            return None
+        return filename, os.path.join(save_dir, filename), audio_format, subtype, sample_rate
 
     def start_generation(self):
-        """Start audio generation in background thread."""
-        if self.worker_thread and self.worker_thread.is_alive():
-            messagebox.showinfo('Generation in Progress', 'Please wait for the current generation to complete.')
+        """Queue audio generation; it runs after earlier generations, yielding to previews."""
+        if self.excerpt_path is not None:
+            messagebox.showwarning('File Excerpt', 'The editor shows a read-only excerpt of a file being synthesized. '
+                                                   'Use "Synthesize from file" again, or wait for it to finish.')
             return
-
         text = self.text_box.get('1.0', 'end').strip()
         if not text:
             messagebox.showwarning('No Text', 'Please enter some text to synthesize.')
             return
 
-        filename = self.filename_var.get().strip()
-        if not filename:
-            messagebox.showwarning('No Filename', 'Please enter a filename for the output.')
+        settings = self._output_settings()
+        if settings is None:
             return
+        filename, save_path, audio_format, subtype, sample_rate = settings
+        voice = self._get_voice_code(self.voice_var.get())
+        speed = self.speed_var.get()
 
-        save_dir = self.save_dir_var.get().strip()
-        if not os.path.isdir(save_dir):
-            messagebox.showwarning('Invalid Directory', 'Please select a valid save directory.')
+        ahead = len(self.scheduler.jobs())
+        self.scheduler.submit(f'Generate {filename}', PRIORITY_GENERATE,
+                              lambda job: self.generate_worker(text, voice, speed, save_path, job.cancel_event, job,
+                                                               audio_format=audio_format, subtype=subtype,
+                                                               sample_rate=sample_rate))
+        if ahead:
+            self.status_var.set(f'⏳ Queued {filename} ({ahead} ahead)')
+        else:
+            self.status_var.set('🎙 Starting generation...')
+            self.progress_var.set(0)
+
+    def start_file_generation(self):
+        """Pick a text file and queue it for synthesis straight from disk.
+
+        The file is memory-mapped and chunked lazily (see MappedTextFile), so
+        book-length manuscripts never go through the editor; it only shows a
+        read-only excerpt until the job ends.
+        """
+        path = filedialog.askopenfilename(title='Synthesize from file',
+                                          filetypes=[('Text files', '*.txt *.md'), ('All files', '*.*')])
+        if not path:
+            return
+        settings = self._output_settings()
+        if settings is None:
+            return
+        filename, save_path, audio_format, subtype, sample_rate = settings
+        try:
+            with MappedTextFile(path) as source:
+                excerpt, size = source.excerpt(), source.size
+        except (OSError, ValueError) as e:
+            messagebox.showerror('Cannot Read File', str(e))
+            return
+        if not excerpt.strip():
+            messagebox.showwarning('No Text', f'{os.path.basename(path)} is empty.')
             return
 
-        # Auto-append .wav if not present
-        if not filename.lower().endswith('.wav'):
-            filename += '.wav'
-
-        save_path = os.path.join(save_dir, filename)
-
+        self._show_file_excerpt(path, excerpt, size)
         voice = self._get_voice_code(self.voice_var.get())
-
-        # Reset cancel event
-        self.cancel_event.clear()
-
-        # Update UI state
-        self.generate_btn.config(state='disabled')
-        self.cancel_btn.config(state='normal')
-        self.status_var.set('🎙 Starting generation...')
-        self.progress_var.set(0)
-
-        # Start background thread
-        self.worker_thread = threading.Thread(
-            target=self.generate_worker,
-            args=(text, voice, save_path, self.cancel_event),
-            daemon=True
-        )
-        self.worker_thread.start()
-
-    def start_preview(self):
-        """Generate a 5-second audio preview from the first 500 characters of text."""
-        if self.worker_thread and self.worker_thread.is_alive():
-            messagebox.showinfo('Generation in Progress', 'Please wait for current generation to complete.')
+        speed = self.speed_var.get()
+        ahead = len(self.scheduler.jobs())
+        self.scheduler.submit(f'Generate {filename} from {os.path.basename(path)}', PRIORITY_GENERATE,
+                              lambda job: self.file_generate_worker(path, voice, speed, save_path, job.cancel_event,
+                                                                    job, audio_format=audio_format, subtype=subtype,
+                                                                    sample_rate=sample_rate))
+        if ahead:
+            self.status_var.set(f'⏳ Queued {filename} ({ahead} ahead)')
+        else:
+            self.status_var.set('🎙 Starting generation...')
+            self.progress_var.set(0)
+
+    def _show_file_excerpt(self, path, excerpt, size):
+        """Replace the editor with a read-only excerpt of path, keeping the typed text to restore later."""
+        if self.excerpt_path is None:
+            self.editor_backup = self.text_box.get('1.0', 'end-1c')
+        self.excerpt_path = path
+        self.text_box.config(state='normal')
+        self.text_box.delete('1.0', 'end')
+        self.text_box.insert('1.0', excerpt)
+        if len(excerpt) < size:
+            self.text_box.insert('end', f'\n\n… (read-only excerpt of {os.path.basename(path)})')
+        self.text_box.config(state='disabled')
+        self.char_count_var.set(f'📄 {os.path.basename(path)} • {size / 1e6:.1f} MB')
+
+    def _restore_editor(self, path):
+        """Give the editor back once the job for the excerpted file ends (main thread)."""
+        if self.excerpt_path != path:
             return
+        self.excerpt_path = None
+        self.text_box.config(state='normal')
+        self.text_box.delete('1.0', 'end')
+        self.text_box.insert('1.0', self.editor_backup or '')
+        self.editor_backup = None
+        self._on_text_modified()
 
+    def start_preview(self):
+        """Play a preview of the first 500 characters, pausing any running generation."""
         text = self.text_box.get('1.0', 'end').strip()
         if not text:
             messagebox.showwarning('No Text', 'Please enter some text to preview.')
@@ -1021,172 +3623,1670 @@ class TTSApp:
         # Take first 500 chars or first sentence
         preview_text = text[:500]
         voice = self._get_voice_code(self.voice_var.get())
+        speed = self.speed_var.get()
 
-        # Reset cancel event
-        self.cancel_event.clear()
-
-        # Update UI state
-        self.generate_btn.config(state='disabled')
-        self.cancel_btn.config(state='normal')
         self.status_var.set('🎧 Generating preview...')
+        # Don't save, just play
+        self.scheduler.submit(f'Preview ({self._get_voice_friendly_name(voice)})', PRIORITY_PREVIEW,
+                              lambda job: self._preview_worker(preview_text, voice, speed, job.cancel_event))
 
-        # Start background thread for preview (don't save, just play)
-        self.worker_thread = threading.Thread(
-            target=self._preview_worker,
-            args=(preview_text, voice, self.cancel_event),
-            daemon=True
-        )
-        self.worker_thread.start()
-
-    def _preview_worker(self, text, voice, cancel_event):
-        """Generate preview audio and play it without saving."""
+    def _preview_worker(self, text, voice, speed, cancel_event):
+        """Synthesize the preview into a ring buffer while a sink thread plays it."""
         # Initialize torch lazily
-        global device
-        if device is None:
-            try:
-                import torch
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-            except Exception:
-                device = "cpu"
+        init_device()
 
         # Chunk text for consistent processing
         text_chunks = self.chunk_text(text, max_words=50)
-        speed = self.speed_var.get()
+
+        ring = AudioRingBuffer()
+        joiner = ChunkJoiner() if JOIN_CHUNKS else None
+        sink = create_preview_sink()
+        cache_start = self._cache_snapshot()
+        metrics_start = stage_metrics.snapshot() if stage_metrics is not None else None
+        start_time = time.time()
+        status = 'error'
+
+        def on_first_audio():
+            ttfa = time.time() - start_time
+            self.root.after(0, lambda: self.status_var.set(f'▶️ Playing preview (first audio after {ttfa:.1f}s)...'))
+
+        sink_thread = threading.Thread(
+            target=play_from_buffer,
+            args=(ring, sink, cancel_event, on_first_audio),
+            daemon=True
+        )
+        sink_thread.start()
 
         try:
             self.root.after(0, lambda: self.status_var.set('🎧 Generating preview...'))
-            audio_segments = []
 
-            for chunk in text_chunks:
-                if cancel_event.is_set():
-                    return
-
-                chunk_lang = self.detect_language_code(chunk)
-                chunk_voice, pipeline_lang = self.get_optimal_voice_for_language(voice, chunk_lang)
-                processed_chunk = self.transliterate_bengali_to_hindi(chunk) if chunk_lang == 'bn' else chunk
-
-                pipeline = self._get_pipeline_for_lang(pipeline_lang)
-                gen = pipeline(processed_chunk, voice=chunk_voice, speed=speed, split_pattern=r'\n+')
-                for _, _, audio in gen:
-                    audio_segments.append(np.asarray(audio))
-
-            if audio_segments:
-                full_audio = np.concatenate(audio_segments, axis=0)
-                temp_path = os.path.join(os.path.expanduser('~'), '.tts_preview.wav')
-                sf.write(temp_path, full_audio, SAMPLE_RATE)
-                self.root.after(0, lambda: self.status_var.set('▶️ Playing preview...'))
-                self.root.after(0, lambda: self._play_audio_preview(temp_path))
-                self.root.after(0, lambda: self._on_done('✅ Preview complete', success=True))
+            for idx, audio in iter_chunk_audio(text_chunks, voice, speed, cancel_event, cache=chunk_cache, staged=PIPELINED_STAGES):
+                if joiner is not None:
+                    audio = joiner.process(audio, getattr(text_chunks[idx], 'ends_sentence', True))
+                if not ring.write(audio, cancel_event) or sink.error is not None:
+                    break
+            else:
+                if joiner is not None:
+                    ring.write(joiner.flush(), cancel_event)
+
+            ring.close()
+            sink_thread.join()
+
+            status = 'cancelled' if cancel_event.is_set() else 'done'
+            if cancel_event.is_set():
+                self.root.after(0, lambda: self._on_done('🚫 Preview cancelled', success=False))
+            elif sink.error is not None:
+                self.root.after(0, lambda e_msg=str(sink.error): self._on_done(f'❌ Preview playback error: {e_msg}', success=False))
+            elif ring.total_written:
+                cache_info = self._cache_summary(cache_start)
+                message = f'✅ Preview complete ({cache_info})' if cache_info else '✅ Preview complete'
+                self.root.after(0, lambda: self._on_done(message, success=True))
             else:
                 self.root.after(0, lambda: self._on_done('⚠️ No preview generated', success=False))
 
         except Exception as e:
+            ring.close()
             self.root.after(0, lambda e_msg=str(e): self._on_done(f'❌ Preview error: {e_msg}', success=False))
+        finally:
+            self._record_job_metrics('preview', metrics_start, start_time, ring.total_written / SAMPLE_RATE,
+                                     status=status, voice=voice, speed=speed, chunks=len(text_chunks))
 
     def cancel_generation(self):
-        """Request cancellation of ongoing generation."""
-        if self.worker_thread and self.worker_thread.is_alive():
-            self.cancel_event.set()
-            self.status_var.set('⏸ Cancelling...')
-            self.cancel_btn.config(state='disabled')
-
-    def generate_worker(self, text, voice, save_path, cancel_event):
-        """Generate audio by processing text in chunks and merging results."""
-        global device
-        if device is None:
-            try:
-                import torch
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-            except Exception:
-                device = "cpu"
+        """Cancel the job selected in the jobs list, or else the one in the foreground."""
+        job = self.scheduler.cancel(self._selected_job())
+        if job is not None:
+            self.status_var.set(f'⏸ Cancelling {job.label}...')
+
+    def generate_worker(self, text, voice, speed, save_path, cancel_event, job=None, audio_format=None, subtype=None,
+                        sample_rate=SAMPLE_RATE):
+        """Generate audio by processing text in chunks and merging results.
+
+        With a scheduler job, pauses at chunk boundaries while a preview runs.
+        audio_format/subtype select the output encoding (soundfile names;
+        default: from the file extension). Chunks are resampled to sample_rate
+        on their way to the file.
+        """
+        init_device()
 
         text_chunks = self.chunk_text(text, max_words=50)
         temp_dir = os.path.join(os.path.dirname(save_path), '.tts_temp')
-        os.makedirs(temp_dir, exist_ok=True)
+        resume = JobCheckpoint(temp_dir, text, voice, speed, text_chunks, cache=chunk_cache)
+        resumed = len(resume.completed)
+        missing = [idx for idx in range(len(text_chunks)) if idx not in resume.completed]
 
-        speed = self.speed_var.get()
         audio_segments = []
+        joiner = ChunkJoiner() if JOIN_CHUNKS else None
+        resampler = StreamResampler(SAMPLE_RATE, sample_rate)
+        writer = StreamingAudioWriter(save_path, samplerate=sample_rate, format=audio_format, subtype=subtype) if STREAM_TO_DISK else None
+        cache_start = self._cache_snapshot()
+        metrics_start = stage_metrics.snapshot() if stage_metrics is not None else None
+        status = 'error'
+        stage_stats = {}
         self.gen_start_time = time.time()
         self.gen_total_chunks = len(text_chunks)
+        chunk_audio = None
+
+        def update_status(done, total, prog, el, rem, cache_info):
+            self.progress_var.set(prog)
+            el_str = f"{int(el)//60}:{int(el)%60:02d}"
+            rem_str = f"{int(rem)//60}:{int(rem)%60:02d}"
+            self.time_var.set(f"{el_str} / {rem_str}")
+            self.status_var.set(f'⚙️ Chunk {min(done + 1, total)}/{total}... {cache_info}'.rstrip())
 
         try:
-            for chunk_idx, chunk in enumerate(text_chunks):
+            resume_info = f'(resuming, {resumed} done)' if resumed else ''
+            self.root.after(0, lambda total=len(text_chunks): update_status(0, total, 0, 0, 0, resume_info))
+            chunk_audio = iter_chunk_audio(
+                [text_chunks[idx] for idx in missing], voice, speed, cancel_event,
+                cache=chunk_cache, workers=PARALLEL_WORKERS, torch_threads=TORCH_THREADS_PER_WORKER,
+                batch_size=SYNTH_BATCH_SIZE, staged=PIPELINED_STAGES, stage_stats=stage_stats,
+                checkpoint=(lambda: self.scheduler.checkpoint(job)) if job is not None else None
+            )
+            for chunk_idx in range(len(text_chunks)):
                 if cancel_event.is_set():
+                    break
+                if chunk_idx in resume.completed:
+                    audio = resume.load(chunk_idx)
+                    if audio is None:
+                        # Evicted from the cache since the job started: synthesize it again
+                        audio = synthesize_chunk(text_chunks[chunk_idx], voice, speed, chunk_cache)
+                else:
                     try:
-                        shutil.rmtree(temp_dir)
-                    except Exception:
-                        pass
+                        _, audio = next(chunk_audio)
+                    except StopIteration:
+                        break  # cancelled
+                    except ChunkSynthesisError as e:
+                        raise ChunkSynthesisError(missing[e.index], e) from e
+                    resume.save(chunk_idx, audio)
+
+                if joiner is not None:
+                    audio = joiner.process(audio, getattr(text_chunks[chunk_idx], 'ends_sentence', True))
+                audio = resampler.process(audio)
+                if writer is not None:
+                    writer.write(audio)
+                elif audio.size:
+                    audio_segments.append(audio)
+
+                done = chunk_idx + 1
+                progress = (done / len(text_chunks)) * 100
+                elapsed = time.time() - self.gen_start_time - (job.paused_seconds if job is not None else 0)
+                # Estimate from chunks synthesized in this run, not ones loaded from checkpoints
+                synthesized = sum(1 for idx in missing if idx < done)
+                remaining = elapsed / synthesized * (len(missing) - synthesized) if synthesized else 0
+                if job is not None:
+                    job.detail = f'{done}/{len(text_chunks)}'
+                    self.root.after(0, self._refresh_jobs)
+                self.root.after(0, lambda done=done, total=len(text_chunks), prog=progress, el=elapsed, rem=remaining,
+                    cache_info=self._cache_summary(cache_start): update_status(done, total, prog, el, rem, cache_info))
+            # Stop the synthesis stages and collect their stats
+            chunk_audio.close()
+            tail = resampler.process(joiner.flush()) if joiner is not None else np.zeros(0, dtype=np.float32)
+            tail = np.concatenate([tail, resampler.flush()])
+            if writer is not None:
+                writer.write(tail)
+            elif tail.size:
+                audio_segments.append(tail)
+
+            if cancel_event.is_set():
+                status = 'cancelled'
+                if writer is not None and writer.frames:
+                    writer.close()
+                    self.root.after(0, lambda: self._on_done('🚫 Generation cancelled (partial audio kept; generate again to resume)', success=False))
+                elif resume.completed:
+                    self.root.after(0, lambda: self._on_done('🚫 Generation cancelled (generate again to resume)', success=False))
+                else:
                     self.root.after(0, lambda: self._on_done('🚫 Generation cancelled', success=False))
-                    return
+                return
 
-                progress = (chunk_idx / len(text_chunks)) * 100
-                elapsed = time.time() - self.gen_start_time
-                per_chunk = elapsed / (chunk_idx + 1) if chunk_idx > 0 else 1
-                remaining = per_chunk * (len(text_chunks) - chunk_idx - 1)
-
-                def update_status(idx, total, prog, el, rem):
-                    self.progress_var.set(prog)
-                    el_str = f"{int(el)//60}:{int(el)%60:02d}"
-                    rem_str = f"{int(rem)//60}:{int(rem)%60:02d}"
-                    self.time_var.set(f"{el_str} / {rem_str}")
-                    self.status_var.set(f'⚙️ Chunk {idx+1}/{total}...')
-
-                self.root.after(0, lambda idx=chunk_idx, total=len(text_chunks), prog=progress, el=elapsed, rem=remaining:
-                    update_status(idx, total, prog, el, rem))
-
-                chunk_lang = self.detect_language_code(chunk)
-                chunk_voice, pipeline_lang = self.get_optimal_voice_for_language(voice, chunk_lang)
-                processed_chunk = self.transliterate_bengali_to_hindi(chunk) if chunk_lang == 'bn' else chunk
-                pipeline = self._get_pipeline_for_lang(pipeline_lang)
-
-                try:
-                    gen = pipeline(processed_chunk, voice=chunk_voice, speed=speed, split_pattern=r'\n+')
-                    chunk_audio = []
-                    for _, _, audio in gen:
-                        audio_np = np.asarray(audio)
-                        chunk_audio.append(audio_np)
-
-                    if chunk_audio:
-                        chunk_full = np.concatenate(chunk_audio, axis=0)
-                        audio_segments.append(chunk_full)
-                except Exception as e:
-                    self.root.after(0, lambda e_msg=str(e), idx=chunk_idx: self._on_done(f'❌ Error in chunk {idx+1}: {e_msg}', success=False))
-                    try:
-                        shutil.rmtree(temp_dir)
-                    except Exception:
-                        pass
-                    return
-
-            if audio_segments:
+            if writer is not None:
+                writer.close()
+                frames, encode_seconds = writer.frames, writer.encode_seconds
+            elif audio_segments:
                 full_audio = np.concatenate(audio_segments, axis=0)
-                sf.write(save_path, full_audio, SAMPLE_RATE)
+                encode_start = time.perf_counter()
+                with stage_timer('encode'):
+                    sf.write(save_path, full_audio, sample_rate, format=audio_format, subtype=subtype)
+                frames, encode_seconds = len(full_audio), time.perf_counter() - encode_start
+            else:
+                frames, encode_seconds = 0, 0.0
+            has_audio = frames > 0
+            status = 'done' if has_audio else 'empty'
 
+            resume.discard()
+            if has_audio:
                 word_count = len(text.split())
                 filename = os.path.basename(save_path)
-                self.root.after(0, lambda wc=word_count, fn=filename: self._add_to_history(fn, voice, wc))
-
-                self.root.after(0, lambda: self._on_done('✅ Audio saved successfully!', success=True))
+                lang_chars = {}
+                for chunk in text_chunks:
+                    count_languages(chunk, lang_chars)
+                self.root.after(0, lambda wc=word_count, fn=filename, mix=language_mix(lang_chars),
+                                wall=time.time() - self.gen_start_time: self._add_to_history(
+                                    fn, voice, wc, path=save_path, lang_mix=mix, audio_seconds=frames / sample_rate,
+                                    wall_seconds=wall))
+
+                output_info = format_output_stats(save_path, frames, encode_seconds)
+                if sample_rate != SAMPLE_RATE:
+                    output_info += f', resampled to {sample_rate / 1000:g} kHz'
+                if joiner is not None:
+                    output_info += f', {joiner.summary()}'
+                timings = self._record_job_metrics('generate', metrics_start, self.gen_start_time, frames / sample_rate,
+                                                   status=status, output=save_path, voice=voice, speed=speed,
+                                                   chunks=len(text_chunks), resumed_chunks=resumed)
+                details = '; '.join(filter(None, [output_info, self._cache_summary(cache_start),
+                                                  format_stage_stats(stage_stats), timings]))
+                message = f'✅ Audio saved successfully! ({details})' if details else '✅ Audio saved successfully!'
+                self.root.after(0, lambda: self._on_done(message, success=True))
             else:
                 self.root.after(0, lambda: self._on_done('⚠️ No audio generated', success=False))
 
+        except ChunkSynthesisError as e:
+            self.root.after(0, lambda e_msg=str(e), idx=e.index: self._on_done(f'❌ Error in chunk {idx+1}: {e_msg}', success=False))
         except Exception as e:
             self.root.after(0, lambda e_msg=str(e): self._on_done(f'❌ Error: {e_msg}', success=False))
         finally:
+            if chunk_audio is not None:
+                # Stops the synthesis stages or pool tasks on every exit path (no-op once closed)
+                chunk_audio.close()
+            resume.close()
+            if writer is not None:
+                writer.close()
+            if status != 'done':
+                self._record_job_metrics('generate', metrics_start, self.gen_start_time,
+                                         (writer.frames if writer is not None else 0) / sample_rate,
+                                         status=status, output=save_path, voice=voice, speed=speed,
+                                         chunks=len(text_chunks), resumed_chunks=resumed)
             try:
-                shutil.rmtree(temp_dir)
-            except Exception:
+                # Only goes away once no job has checkpoints left in it
+                os.rmdir(temp_dir)
+            except OSError:
                 pass
 
+    def file_generate_worker(self, path, voice, speed, save_path, cancel_event, job=None, audio_format=None,
+                             subtype=None, sample_rate=SAMPLE_RATE):
+        """Synthesize a text file into save_path, reading it through a memory map.
+
+        Chunks are produced lazily as synthesis needs them and audio streams to
+        disk, so memory use does not grow with the file. Progress and ETA follow
+        the byte offset reached in the file. Unlike generate_worker there is no
+        resume: that needs the full chunk list up front.
+        """
+        init_device()
+        source = MappedTextFile(path)
+        offsets = {}  # chunk index -> (byte offset reached once it is spoken, chunk ends a sentence)
+        words = 0
+        lang_chars = {}
+
+        def text_chunks():
+            nonlocal words
+            for idx, (chunk, offset) in enumerate(iter_file_chunks(source)):
+                offsets[idx] = offset, getattr(chunk, 'ends_sentence', True)
+                words += len(chunk.split())
+                count_languages(chunk, lang_chars)
+                yield chunk
+
+        joiner = ChunkJoiner() if JOIN_CHUNKS else None
+        resampler = StreamResampler(SAMPLE_RATE, sample_rate)
+        writer = StreamingAudioWriter(save_path, samplerate=sample_rate, format=audio_format, subtype=subtype)
+        cache_start = self._cache_snapshot()
+        metrics_start = stage_metrics.snapshot() if stage_metrics is not None else None
+        status = 'error'
+        stage_stats = {}
+        chunks = 0
+        self.gen_start_time = time.time()
+        size_mb = source.size / 1e6
+        chunk_audio = None
+
+        def update_status(done, offset, el, rem, cache_info):
+            self.progress_var.set(100 * offset / source.size if source.size else 0)
+            self.time_var.set(f"{int(el)//60}:{int(el)%60:02d} / {int(rem)//60}:{int(rem)%60:02d}")
+            self.status_var.set(f'⚙️ Chunk {done}, {offset / 1e6:.1f}/{size_mb:.1f} MB... {cache_info}'.rstrip())
+
+        try:
+            chunk_audio = iter_chunk_audio(
+                text_chunks(), voice, speed, cancel_event,
+                cache=chunk_cache, workers=PARALLEL_WORKERS, torch_threads=TORCH_THREADS_PER_WORKER,
+                batch_size=SYNTH_BATCH_SIZE, staged=PIPELINED_STAGES, stage_stats=stage_stats,
+                checkpoint=(lambda: self.scheduler.checkpoint(job)) if job is not None else None
+            )
+            start_offset = source.start
+            for idx, audio in chunk_audio:
+                offset, ends_sentence = offsets.pop(idx)
+                if joiner is not None:
+                    audio = joiner.process(audio, ends_sentence)
+                writer.write(resampler.process(audio))
+                chunks += 1
+
+                elapsed = time.time() - self.gen_start_time - (job.paused_seconds if job is not None else 0)
+                done_bytes = offset - start_offset
+                remaining = elapsed / done_bytes * (source.size - offset) if done_bytes else 0
+                if job is not None:
+                    job.detail = f'{100 * offset // max(source.size, 1)}%'
+                    self.root.after(0, self._refresh_jobs)
+                self.root.after(0, lambda done=chunks, offset=offset, el=elapsed, rem=remaining,
+                                cache_info=self._cache_summary(cache_start): update_status(done, offset, el, rem, cache_info))
+            chunk_audio.close()
+            tail = resampler.process(joiner.flush()) if joiner is not None else np.zeros(0, dtype=np.float32)
+            writer.write(np.concatenate([tail, resampler.flush()]))
+            writer.close()
+
+            if cancel_event.is_set():
+                status = 'cancelled'
+                note = ' (partial audio kept)' if writer.frames else ''
+                self.root.after(0, lambda: self._on_done(f'🚫 Generation cancelled{note}', success=False))
+                return
+            if not writer.frames:
+                status = 'empty'
+                self.root.after(0, lambda: self._on_done('⚠️ No audio generated', success=False))
+                return
+
+            status = 'done'
+            filename = os.path.basename(save_path)
+            self.root.after(0, lambda wc=words, fn=filename, mix=language_mix(lang_chars),
+                            wall=time.time() - self.gen_start_time: self._add_to_history(
+                                fn, voice, wc, path=save_path, lang_mix=mix,
+                                audio_seconds=writer.frames / sample_rate, wall_seconds=wall))
+            output_info = format_output_stats(save_path, writer.frames, writer.encode_seconds)
+            if sample_rate != SAMPLE_RATE:
+                output_info += f', resampled to {sample_rate / 1000:g} kHz'
+            if joiner is not None:
+                output_info += f', {joiner.summary()}'
+            timings = self._record_job_metrics('generate', metrics_start, self.gen_start_time,
+                                               writer.frames / sample_rate, status=status, input=path,
+                                               output=save_path, voice=voice, speed=speed, chunks=chunks,
+                                               input_bytes=source.size)
+            details = '; '.join(filter(None, [output_info, self._cache_summary(cache_start),
+                                              format_stage_stats(stage_stats), timings]))
+            self.root.after(0, lambda: self._on_done(f'✅ Audio saved successfully! ({details})', success=True))
+
+        except ChunkSynthesisError as e:
+            self.root.after(0, lambda e_msg=str(e), idx=e.index: self._on_done(f'❌ Error in chunk {idx+1}: {e_msg}', success=False))
+        except Exception as e:
+            self.root.after(0, lambda e_msg=str(e): self._on_done(f'❌ Error: {e_msg}', success=False))
+        finally:
+            if chunk_audio is not None:
+                # Stop the front-end before the map it reads from goes away
+                chunk_audio.close()
+            writer.close()
+            source.close()
+            if status != 'done':
+                self._record_job_metrics('generate', metrics_start, self.gen_start_time, writer.frames / sample_rate,
+                                         status=status, input=path, output=save_path, voice=voice, speed=speed,
+                                         chunks=chunks, input_bytes=source.size)
+            self.root.after(0, lambda: self._restore_editor(path))
+
+    def _record_job_metrics(self, kind, start_snapshot, started, audio_seconds, **details):
+        """Export a finished job's stage timings and keep them for the details window.
+
+        Returns a short summary of the slowest stages ('' with metrics off).
+        """
+        if stage_metrics is None:
+            return ''
+        stages = stage_metrics.since(start_snapshot)
+        wall = time.time() - started
+        record = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'kind': kind,
+            **details,
+            'wall_seconds': round(wall, 3),
+            'audio_seconds': round(audio_seconds, 3),
+            'rtf': round(wall / audio_seconds, 4) if audio_seconds else None,
+            'stages': stages,
+        }
+        stage_metrics.record_job(record)
+        self.last_job_metrics = record
+        return format_stage_timings(stages)
+
+    def _show_stage_timings(self):
+        """Open a window with the per-stage timings of the last finished job."""
+        record = self.last_job_metrics
+        if stage_metrics is None:
+            messagebox.showinfo('Stage Timings', 'Stage metrics are turned off (STAGE_METRICS = False).')
+            return
+        if record is None:
+            messagebox.showinfo('Stage Timings', 'No finished job yet.')
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title('Stage Timings')
+        window.configure(bg=COLORS['background'])
+        rtf = f", RTF {record['rtf']}" if record.get('rtf') else ''
+        ttk.Label(
+            window,
+            text=f"{record['kind'].title()} ({record['status']}): {record['wall_seconds']:.1f}s wall, "
+                 f"{record['audio_seconds']:.1f}s audio{rtf}",
+            style='Heading.TLabel'
+        ).pack(anchor='w', padx=12, pady=(12, 6))
+
+        columns = ('calls', 'seconds', 'mean', 'share')
+        tree = ttk.Treeview(window, columns=columns, height=12)
+        tree.heading('#0', text='Stage')
+        for column, title in zip(columns, ('Calls', 'Total (s)', 'Mean (ms)', 'Share of wall')):
+            tree.heading(column, text=title)
+            tree.column(column, width=100, anchor='e')
+        for stage, stats in sorted(record['stages'].items(), key=lambda item: -item[1]['seconds']):
+            share = stats['seconds'] / record['wall_seconds'] * 100 if record['wall_seconds'] else 0
+            tree.insert('', 'end', text=stage, values=(
+                stats['calls'], f"{stats['seconds']:.3f}", f"{stats['seconds'] / stats['calls'] * 1000:.2f}", f'{share:.0f}%'))
+        tree.pack(fill='both', expand=True, padx=12, pady=(0, 6))
+        ttk.Label(
+            window,
+            text='Stages run on several threads at once, so shares can add up to more than 100%.',
+            style='Muted.TLabel'
+        ).pack(anchor='w', padx=12, pady=(0, 12))
+
     def _on_done(self, message, success=True):
         """Update UI when generation completes or fails."""
         self.status_var.set(message)
         self.progress_var.set(100 if success else 0)
         self.time_var.set('Done' if success else '--:-- / --:--')
-        self.generate_btn.config(state='normal')
-        self.cancel_btn.config(state='disabled')
 
 
-def main():
+# ---------------------------------------------------------------------------
+# Headless HTTP server (python app.py serve)
+# ---------------------------------------------------------------------------
+
+# OpenAI voice names mapped to the closest Kokoro voice
+OPENAI_VOICES = {
+    'alloy': 'af_alloy',
+    'ash': 'am_adam',
+    'coral': 'af_heart',
+    'echo': 'am_echo',
+    'fable': 'bm_fable',
+    'onyx': 'am_onyx',
+    'nova': 'af_nova',
+    'sage': 'af_sarah',
+    'shimmer': 'af_bella',
+}
+
+# response_format -> (soundfile format, subtype, content type); 'pcm' is raw 16-bit little-endian
+RESPONSE_FORMATS = {
+    'wav': ('WAV', 'PCM_16', 'audio/wav'),
+    'flac': ('FLAC', 'PCM_16', 'audio/flac'),
+    'opus': ('OGG', 'OPUS', 'audio/ogg'),
+    'mp3': ('MP3', 'MPEG_LAYER_III', 'audio/mpeg'),
+    'pcm': ('RAW', 'PCM_16', 'audio/pcm'),
+}
+
+MAX_INPUT_CHARS = 4096
+
+
+class RequestError(Exception):
+    """Client error in an API request; carries the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def synthesize_text(text, voice, speed, cancel_event=None):
+    """Synthesize a whole text headlessly and return the concatenated audio."""
+    cancel_event = cancel_event or threading.Event()
+    init_device()
+    text_chunks = chunk_text(text)
+    segments = [(idx, audio) for idx, audio in iter_chunk_audio(
+        text_chunks, voice, speed, cancel_event, cache=chunk_cache, batch_size=SYNTH_BATCH_SIZE
+    )]
+    if JOIN_CHUNKS:
+        joiner = ChunkJoiner()
+        segments = [joiner.process(audio, getattr(text_chunks[idx], 'ends_sentence', True))
+                    for idx, audio in segments] + [joiner.flush()]
+    else:
+        segments = [audio for _, audio in segments]
+    segments = [audio for audio in segments if audio.size]
+    return np.concatenate(segments, axis=0) if segments else np.zeros(0, dtype=np.float32)
+
+
+def encode_audio(audio, response_format, samplerate=SAMPLE_RATE):
+    """Encode audio for an API response; returns (bytes, content type)."""
+    import io
+    fmt, subtype, content_type = RESPONSE_FORMATS[response_format]
+    buf = io.BytesIO()
+    if fmt == 'RAW':
+        buf.write((np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes())
+    else:
+        sf.write(buf, audio, samplerate, format=fmt, subtype=subtype)
+    return buf.getvalue(), content_type
+
+
+def parse_speech_request(body):
+    """Validate an OpenAI-style /v1/audio/speech JSON body; returns (text, voice, speed, format, stream)."""
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        raise RequestError('Request body must be JSON')
+    if not isinstance(payload, dict):
+        raise RequestError('Request body must be a JSON object')
+
+    text = payload.get('input')
+    if not isinstance(text, str) or not text.strip():
+        raise RequestError("'input' must be a non-empty string")
+    if len(text) > MAX_INPUT_CHARS:
+        raise RequestError(f"'input' is longer than {MAX_INPUT_CHARS} characters")
+
+    voice_name = str(payload.get('voice') or 'af_heart')
+    voice = OPENAI_VOICES.get(voice_name.lower()) or get_voice_code(voice_name)
+    if voice not in VOICE_LIST:
+        raise RequestError(f"Unknown voice '{voice_name}'")
+
+    try:
+        speed = float(payload.get('speed', 1.0))
+    except (TypeError, ValueError):
+        raise RequestError("'speed' must be a number")
+    if not 0.25 <= speed <= 4.0:
+        raise RequestError("'speed' must be between 0.25 and 4.0")
+
+    response_format = str(payload.get('response_format') or 'wav').lower()
+    if response_format not in RESPONSE_FORMATS:
+        raise RequestError(f"Unsupported response_format '{response_format}' (use one of: {', '.join(RESPONSE_FORMATS)})")
+    return text, voice, speed, response_format, bool(payload.get('stream', False))
+
+
+class _ByteSink:
+    """Write-only file object for libsndfile that hands out encoded bytes as they are produced.
+
+    Writes that seek back into bytes already handed out (e.g. a header patched
+    on close) are dropped; the formats streamed here tolerate that.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._base = 0  # absolute offset of _buf[0]
+        self._pos = 0
+
+    def write(self, data):
+        data = bytes(data)
+        written = len(data)
+        offset = self._pos - self._base
+        if offset < 0:
+            data = data[-offset:]
+            offset = 0
+        end = offset + len(data)
+        if end > len(self._buf):
+            self._buf.extend(bytes(end - len(self._buf)))
+        self._buf[offset:end] = data
+        self._pos += written
+        return written
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self._pos = offset
+        elif whence == 1:
+            self._pos += offset
+        else:
+            self._pos = self._base + len(self._buf) + offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def read(self, size=-1):
+        return b''
+
+    def drain(self):
+        """Return and forget everything written so far."""
+        data = bytes(self._buf)
+        self._base += len(self._buf)
+        self._buf.clear()
+        return data
+
+
+class StreamEncoder:
+    """Incrementally encode float audio blocks for a chunked HTTP response.
+
+    'pcm' is raw 16-bit samples, 'wav' is the same behind a header whose sizes
+    are set to the maximum (the usual convention for streamed WAV), and the
+    compressed formats are encoded by libsndfile as blocks arrive.
+    """
+
+    def __init__(self, response_format, samplerate=SAMPLE_RATE):
+        self.response_format = response_format
+        self.samplerate = samplerate
+        self._sink = None
+        self._file = None
+        self._header_sent = False
+        fmt, subtype, _ = RESPONSE_FORMATS[response_format]
+        if fmt not in ('RAW', 'WAV'):
+            options = {}
+            if response_format == 'mp3':
+                # Constant bitrate: the info tag that tells decoders a VBR stream's
+                # length can't be sent (see _drain), so every frame must be the same
+                # size for the length to follow from the byte count. soundfile only
+                # applies bitrate_mode together with a compression level.
+                options = {'compression_level': 0.5, 'bitrate_mode': 'CONSTANT'}
+            self._sink = _ByteSink()
+            self._file = sf.SoundFile(self._sink, mode='w', samplerate=samplerate, channels=1, format=fmt, subtype=subtype,
+                                      **options)
+
+    def _wav_header(self):
+        import struct
+        byte_rate = self.samplerate * 2
+        return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+                + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, self.samplerate, byte_rate, 2, 16)
+                + b'data' + struct.pack('<I', 0xFFFFFFFF))
+
+    def _drain(self):
+        data = self._sink.drain()
+        if self.response_format == 'mp3' and not self._header_sent and data:
+            # LAME reserves the first frame for its info tag and only fills it
+            # in on close; sent as zeros it makes decoders misjudge the length
+            self._header_sent = True
+            next_frame = data.find(b'\xff', 4)
+            if next_frame > 0 and not data[4:next_frame].strip(b'\x00'):
+                data = data[next_frame:]
+        return data
+
+    def encode(self, audio):
+        """Return the bytes to send for the next block of samples."""
+        if self._file is not None:
+            self._file.write(audio)
+            return self._drain()
+        data = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+        if self.response_format == 'wav' and not self._header_sent:
+            self._header_sent = True
+            data = self._wav_header() + data
+        return data
+
+    def finish(self):
+        """Flush the encoder and return any trailing bytes."""
+        if self._file is not None:
+            self._file.close()
+            return self._drain()
+        if self.response_format == 'wav' and not self._header_sent:
+            self._header_sent = True
+            return self._wav_header()
+        return b''
+
+
+class LatencyStats:
+    """Rolling per-request latency metrics for the server's /metrics endpoint."""
+
+    def __init__(self, window=1000):
+        self.samples = {name: deque(maxlen=window) for name in ('queue_wait', 'ttfb', 'synthesis', 'total')}
+        self.counters = {'requests': 0, 'completed': 0, 'rejected': 0, 'client_errors': 0, 'server_errors': 0, 'disconnected': 0}
+        self.audio_seconds = 0.0
+        self.synthesis_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def record(self, **durations):
+        with self._lock:
+            for name, value in durations.items():
+                if name in self.samples:
+                    self.samples[name].append(value)
+            self.audio_seconds += durations.get('audio', 0.0)
+            self.synthesis_seconds += durations.get('synthesis', 0.0)
+
+    def snapshot(self):
+        def percentiles(values):
+            if not values:
+                return None
+            ordered = sorted(values)
+            pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+            return {'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(ordered[-1], 4)}
+
+        with self._lock:
+            return {
+                **self.counters,
+                'latency': {name: percentiles(values) for name, values in self.samples.items()},
+                'audio_seconds': round(self.audio_seconds, 2),
+                'real_time_factor': round(self.synthesis_seconds / self.audio_seconds, 4) if self.audio_seconds else None,
+            }
+
+
+class SpeechServer:
+    """Minimal asyncio HTTP server exposing an OpenAI-compatible speech endpoint.
+
+    Requests go into a bounded queue drained by a fixed number of synthesis
+    workers (each runs one job at a time on a thread pool). When the queue is
+    full the server answers 429 instead of piling up work. Workers share the
+    loaded pipelines, whose model calls take PipelineManager.lock: parallel
+    requests overlap chunking, G2P, encoding and network I/O, and requests in
+    different languages synthesize in parallel, but two requests for the same
+    pipeline take turns in the model.
+    """
+
+    def __init__(self, host='127.0.0.1', port=8880, workers=2, queue_size=16):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queue_size = queue_size
+        self.stats = LatencyStats()
+        self._queue = None
+        self._executor = None
+
+    async def serve(self):
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='synth')
+        worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        print(f'{APP_NAME} server listening on http://{self.host}:{self.port} '
+              f'({self.workers} workers, queue {self.queue_size})', file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for task in worker_tasks:
+                task.cancel()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _worker(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            job, future = await self._queue.get()
+            try:
+                job['started'] = time.perf_counter()
+                result = await loop.run_in_executor(self._executor, self._synthesize, job)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def _synthesize_stream(self, job):
+        """Runs on a synthesis thread: encode each chunk as soon as it is ready and hand it to the response.
+
+        Blocks while the response's queue is full; stops when the client
+        disconnects (job['cancel'] is set) and ends the stream with None.
+        """
+        import asyncio
+        from concurrent.futures import TimeoutError as FutureTimeout
+        loop, blocks, cancel_event = job['loop'], job['blocks'], job['cancel']
+
+        def hand_over(item):
+            future = asyncio.run_coroutine_threadsafe(blocks.put(item), loop)
+            while not cancel_event.is_set():
+                try:
+                    future.result(timeout=0.1)
+                    return True
+                except FutureTimeout:
+                    pass
+            future.cancel()
+            return False
+
+        frames = 0
+        try:
+            init_device()
+            encoder = StreamEncoder(job['format'])
+            joiner = ChunkJoiner() if JOIN_CHUNKS else None
+            text_chunks = chunk_text(job['text'])
+            chunks = iter_chunk_audio(text_chunks, job['voice'], job['speed'], cancel_event, cache=chunk_cache)
+            for idx, audio in chunks:
+                if joiner is not None:
+                    audio = joiner.process(audio, getattr(text_chunks[idx], 'ends_sentence', True))
+                frames += len(audio)
+                data = encoder.encode(audio) if audio.size else b''
+                if data and not hand_over(data):
+                    return frames / SAMPLE_RATE
+            if joiner is not None and not cancel_event.is_set():
+                audio = joiner.flush()
+                frames += len(audio)
+                data = encoder.encode(audio) if audio.size else b''
+                if data and not hand_over(data):
+                    return frames / SAMPLE_RATE
+            tail = encoder.finish()
+            if tail:
+                hand_over(tail)
+        except Exception as e:
+            hand_over(e)
+        hand_over(None)
+        return frames / SAMPLE_RATE
+
+    def _synthesize(self, job):
+        """Runs on a synthesis thread: text to encoded audio bytes."""
+        if job.get('blocks') is not None:
+            return self._synthesize_stream(job)
+        audio = synthesize_text(job['text'], job['voice'], job['speed'])
+        body, content_type = encode_audio(audio, job['format'])
+        return body, content_type, len(audio) / SAMPLE_RATE
+
+    async def _read_request(self, reader):
+        """Parse one HTTP/1.1 request; returns (method, path, headers, body).
+
+        Raises RequestError for a request that deserves an error response and
+        asyncio.IncompleteReadError if the client goes away mid-request.
+        """
+        import asyncio
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            # The header block outgrew the stream buffer (64 KiB)
+            raise RequestError('Request header too large', 431)
+        if len(head) > 65536:
+            raise RequestError('Request header too large', 431)
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise RequestError('Malformed request line')
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        length = headers.get('content-length') or '0'
+        if not re.fullmatch(r'[0-9]+', length):
+            raise RequestError('Invalid Content-Length')
+        length = int(length)
+        if length > 1024 * 1024:
+            raise RequestError('Request body too large', 413)
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target.split('?', 1)[0], headers, body
+
+    async def _send(self, writer, status, body=b'', content_type='application/json', headers=None):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+                   429: 'Too Many Requests', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+        head = [f'HTTP/1.1 {status} {reasons.get(status, "")}', f'Content-Type: {content_type}',
+                f'Content-Length: {len(body)}', 'Connection: close']
+        head += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, headers=None):
+        await self._send(writer, status, json.dumps(payload).encode('utf-8'), headers=headers)
+
+    async def _send_error(self, writer, status, message):
+        error_type = 'invalid_request_error' if status < 500 else 'server_error'
+        await self._send_json(writer, status, {'error': {'message': message, 'type': error_type}})
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            try:
+                method, path, headers, body = await self._read_request(reader)
+            except RequestError as e:
+                await self._send_error(writer, e.status, str(e))
+                return
+            except Exception:
+                return  # client went away mid-request
+
+            if path == '/health' and method == 'GET':
+                await self._send_json(writer, 200, {'status': 'ok', 'queued': self._queue.qsize()})
+            elif path == '/metrics' and method == 'GET':
+                await self._send_json(writer, 200, {
+                    **self.stats.snapshot(),
+                    'queued': self._queue.qsize(),
+                    'pipelines': pipeline_manager.stats(),
+                    'stages': stage_metrics.since({}) if stage_metrics is not None else None,
+                })
+            elif path == '/v1/models' and method == 'GET':
+                await self._send_json(writer, 200, {'object': 'list', 'data': [{'id': 'kokoro', 'object': 'model'}]})
+            elif path == '/v1/audio/speech':
+                if method != 'POST':
+                    await self._send_error(writer, 405, 'Use POST')
+                else:
+                    await self._handle_speech(reader, writer, body)
+            else:
+                await self._send_error(writer, 404, f'No route for {method} {path}')
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_speech(self, reader, writer, body):
+        import asyncio
+        received = time.perf_counter()
+        self.stats.count('requests')
+        try:
+            text, voice, speed, response_format, stream = parse_speech_request(body)
+        except RequestError as e:
+            self.stats.count('client_errors')
+            await self._send_error(writer, e.status, str(e))
+            return
+
+        job = {'text': text, 'voice': voice, 'speed': speed, 'format': response_format}
+        if stream:
+            job.update(loop=asyncio.get_running_loop(), blocks=asyncio.Queue(maxsize=8), cancel=threading.Event())
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((job, future))
+        except asyncio.QueueFull:
+            self.stats.count('rejected')
+            await self._send_json(writer, 429, {'error': {'message': 'Server busy, retry later', 'type': 'rate_limit_error'}},
+                                  headers={'Retry-After': '1'})
+            return
+
+        if stream:
+            await self._stream_response(reader, writer, job, future, received)
+            return
+
+        try:
+            audio_bytes, content_type, audio_seconds = await future
+        except Exception as e:
+            self.stats.count('server_errors')
+            await self._send_error(writer, 500, f'Synthesis failed: {e}')
+            return
+
+        finished = time.perf_counter()
+        timings = {
+            'queue_wait': job['started'] - received,
+            'ttfb': finished - received,
+            'synthesis': finished - job['started'],
+            'total': finished - received,
+            'audio': audio_seconds,
+        }
+        self.stats.count('completed')
+        self.stats.record(**timings)
+        await self._send(writer, 200, audio_bytes, content_type, headers={
+            'X-Queue-Wait-Ms': f"{timings['queue_wait'] * 1000:.0f}",
+            'X-Synthesis-Ms': f"{timings['synthesis'] * 1000:.0f}",
+        })
+        print(f'POST /v1/audio/speech 200 voice={voice} chars={len(text)} audio={audio_seconds:.1f}s '
+              f"total={timings['total'] * 1000:.0f}ms", file=sys.stderr)
+
+
+    async def _stream_response(self, reader, writer, job, future, received):
+        """Send a job's audio with chunked transfer encoding as each chunk is synthesized."""
+        import asyncio
+        cancel_event = job['cancel']
+
+        async def watch_disconnect():
+            # Returns True if the client reset the connection. EOF alone may be a client
+            # half-closing after its body and still reading; if it has really gone, the
+            # next write fails instead
+            try:
+                while await reader.read(65536):
+                    pass
+            except ConnectionError:
+                return True
+            return False
+
+        async def next_block():
+            getter = asyncio.ensure_future(job['blocks'].get())
+            if not watcher.done():
+                await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if watcher.done() and watcher.result():
+                getter.cancel()
+                raise ConnectionResetError('client disconnected')
+            return await getter
+
+        watcher = asyncio.create_task(watch_disconnect())
+        ttfb = None
+        try:
+            item = await next_block()
+            if isinstance(item, Exception):
+                self.stats.count('server_errors')
+                await self._send_error(writer, 500, f'Synthesis failed: {item}')
+                return
+
+            head = ['HTTP/1.1 200 OK', f"Content-Type: {RESPONSE_FORMATS[job['format']][2]}",
+                    'Transfer-Encoding: chunked', 'Connection: close']
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+            while item is not None:
+                if isinstance(item, Exception):
+                    # Headers are already out; closing without the last chunk tells the client it failed
+                    self.stats.count('server_errors')
+                    print(f'Streaming synthesis failed: {item}', file=sys.stderr)
+                    return
+                writer.write(f'{len(item):x}\r\n'.encode('latin-1') + item + b'\r\n')
+                await writer.drain()
+                if ttfb is None:
+                    ttfb = time.perf_counter() - received
+                item = await next_block()
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            cancel_event.set()
+            raise
+        finally:
+            watcher.cancel()
+            if cancel_event.is_set():
+                # The synthesis thread sees the cancel at its next chunk and frees its worker
+                self.stats.count('disconnected')
+                print('POST /v1/audio/speech stream cancelled: client disconnected', file=sys.stderr)
+
+        audio_seconds = await future
+        finished = time.perf_counter()
+        timings = {
+            'queue_wait': job['started'] - received,
+            'ttfb': ttfb if ttfb is not None else finished - received,
+            'synthesis': finished - job['started'],
+            'total': finished - received,
+            'audio': audio_seconds,
+        }
+        self.stats.count('completed')
+        self.stats.record(**timings)
+        print(f"POST /v1/audio/speech 200 (stream) voice={job['voice']} chars={len(job['text'])} "
+              f"audio={audio_seconds:.1f}s ttfb={timings['ttfb'] * 1000:.0f}ms total={timings['total'] * 1000:.0f}ms",
+              file=sys.stderr)
+
+
+def run_server(args) -> int:
+    """Entry point for `python app.py serve`."""
+    import asyncio
+    server = SpeechServer(args.host, args.port, args.workers, args.queue_size)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# Headless batch rendering (python app.py batch)
+# ---------------------------------------------------------------------------
+
+def render_to_file(text, voice, speed, path, response_format='wav', sample_rate=SAMPLE_RATE, cancel_event=None,
+                   workers=0, torch_threads=1):
+    """Synthesize text straight into an audio file without the GUI; returns (chunks, audio_seconds).
+
+    response_format is one of RESPONSE_FORMATS. Chunks are joined, resampled and
+    encoded as they arrive, so memory stays flat however long the text is.
+    workers > 0 synthesizes on the shared process pool (see iter_chunk_audio).
+    """
+    cancel_event = cancel_event or threading.Event()
+    fmt, subtype, _ = RESPONSE_FORMATS[response_format]
+    text_chunks = chunk_text(text)
+    joiner = ChunkJoiner() if JOIN_CHUNKS else None
+    resampler = StreamResampler(SAMPLE_RATE, sample_rate)
+    with StreamingAudioWriter(path, samplerate=sample_rate, format=fmt, subtype=subtype) as writer:
+        for idx, audio in iter_chunk_audio(text_chunks, voice, speed, cancel_event, cache=chunk_cache,
+                                           workers=workers, torch_threads=torch_threads,
+                                           batch_size=SYNTH_BATCH_SIZE, staged=PIPELINED_STAGES):
+            if joiner is not None:
+                audio = joiner.process(audio, getattr(text_chunks[idx], 'ends_sentence', True))
+            writer.write(resampler.process(audio))
+        tail = resampler.process(joiner.flush()) if joiner is not None else np.zeros(0, dtype=np.float32)
+        writer.write(np.concatenate([tail, resampler.flush()]))
+    return len(text_chunks), writer.frames / sample_rate
+
+
+def load_batch_jobs(source, output_dir, voice='af_heart', speed=1.0, response_format='wav'):
+    """Expand a directory of .txt files or a manifest into a list of job dicts.
+
+    A manifest is JSON Lines (or a .json list) of objects with an 'input' path
+    and optional 'output', 'voice', 'speed' and 'format'; relative paths are
+    resolved against the manifest's directory. Raises ValueError on a bad entry.
+    """
+    if os.path.isdir(source):
+        entries = [{'input': os.path.join(source, name)} for name in sorted(os.listdir(source))
+                   if name.lower().endswith('.txt')]
+    else:
+        with open(source, encoding='utf-8') as f:
+            if source.lower().endswith('.json'):
+                entries = json.load(f)
+            else:
+                entries = [json.loads(line) for line in f if line.strip()]
+        base = os.path.dirname(os.path.abspath(source))
+        for entry in entries:
+            if not isinstance(entry, dict) or not isinstance(entry.get('input'), str):
+                raise ValueError(f"{source}: every entry needs an 'input' path: {entry!r}")
+            entry['input'] = os.path.join(base, entry['input'])
+            if entry.get('output'):
+                entry['output'] = os.path.join(base, entry['output'])
+
+    jobs, outputs = [], set()
+    for entry in entries:
+        voice_name = str(entry.get('voice') or voice)
+        job_voice = get_voice_code(voice_name)
+        if job_voice not in VOICE_LIST:
+            raise ValueError(f"{entry['input']}: unknown voice '{voice_name}'")
+        try:
+            job_speed = float(entry.get('speed', speed))
+        except (TypeError, ValueError):
+            raise ValueError(f"{entry['input']}: 'speed' must be a number")
+        if not 0.25 <= job_speed <= 4.0:
+            raise ValueError(f"{entry['input']}: 'speed' must be between 0.25 and 4.0")
+        job_format = str(entry.get('format') or response_format).lower()
+        if job_format not in RESPONSE_FORMATS:
+            raise ValueError(f"{entry['input']}: unsupported format '{job_format}'")
+        output = entry.get('output') or os.path.join(
+            output_dir, os.path.splitext(os.path.basename(entry['input']))[0] + '.' + job_format)
+        if output in outputs:
+            raise ValueError(f'{output}: written by more than one entry')
+        outputs.add(output)
+        jobs.append({'input': entry['input'], 'output': output, 'voice': job_voice, 'speed': job_speed,
+                     'format': job_format})
+    return jobs
+
+
+def run_batch(args) -> int:
+    """Entry point for `python app.py batch`: render every job on a thread pool, write a JSON summary.
+
+    --workers threads render files at once. With --processes 0 they share
+    the in-process pipelines, which synthesize for one thread at a time
+    (PipelineManager.lock): only reading, chunking, G2P, encoding and writing
+    overlap, plus files in different languages. With --processes N every
+    file's chunks go to one shared pool of N synthesis processes, so inference
+    for same-language files runs in parallel too. Exits 1 if any file failed,
+    2 if the job list is invalid.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    output_dir = args.output_dir
+    try:
+        jobs = load_batch_jobs(args.source, output_dir, args.voice, args.speed, args.format)
+    except (OSError, ValueError) as e:
+        print(f'batch: {e}', file=sys.stderr)
+        return 2
+    if args.sample_rate not in OUTPUT_SAMPLE_RATES:
+        print(f"batch: --sample-rate must be one of {', '.join(map(str, OUTPUT_SAMPLE_RATES))}", file=sys.stderr)
+        return 2
+    if args.sample_rate not in OPUS_SAMPLE_RATES and any(job['format'] == 'opus' for job in jobs):
+        print(f"batch: opus needs a sample rate of {', '.join(map(str, OPUS_SAMPLE_RATES))}", file=sys.stderr)
+        return 2
+    if not jobs:
+        print(f'batch: nothing to render in {args.source}', file=sys.stderr)
+        return 2
+    os.makedirs(output_dir, exist_ok=True)
+    init_device()
+    cancel_event = threading.Event()
+    metrics_start = stage_metrics.snapshot() if stage_metrics is not None else None
+
+    def render(job):
+        started = time.perf_counter()
+        result = dict(job, status='error')
+        try:
+            with open(job['input'], encoding='utf-8-sig') as f:
+                text = f.read()
+            os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+            chunks, audio_seconds = render_to_file(text, job['voice'], job['speed'], job['output'],
+                                                   job['format'], args.sample_rate, cancel_event,
+                                                   workers=args.processes, torch_threads=TORCH_THREADS_PER_WORKER)
+            result.update(characters=len(text), chunks=chunks, audio_seconds=round(audio_seconds, 3))
+            if cancel_event.is_set():
+                result['status'] = 'cancelled'
+            elif not audio_seconds:
+                result.update(status='error', error='no audio generated')
+            else:
+                result['status'] = 'done'
+        except Exception as e:
+            result['error'] = str(e)
+        if result['status'] != 'done' and os.path.exists(job['output']):
+            os.remove(job['output'])
+        wall = time.perf_counter() - started
+        result['wall_seconds'] = round(wall, 3)
+        if result.get('audio_seconds'):
+            result['rtf'] = round(wall / result['audio_seconds'], 4)
+        return result
+
+    started = time.perf_counter()
+    results = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix='batch') as pool:
+        futures = {pool.submit(render, job): idx for idx, job in enumerate(jobs)}
+        try:
+            for finished, future in enumerate(as_completed(futures), 1):
+                result = results[futures[future]] = future.result()
+                detail = f"{result['audio_seconds']:.1f}s audio, RTF {result['rtf']}" \
+                    if result['status'] == 'done' else result.get('error', result['status'])
+                print(f"[{finished}/{len(jobs)}] {result['status']:9s} {result['input']} ({detail})", file=sys.stderr)
+        except KeyboardInterrupt:
+            cancel_event.set()
+            for future in futures:
+                future.cancel()
+            print('batch: cancelling...', file=sys.stderr)
+    wall = time.perf_counter() - started
+
+    results = [result for result in results if result is not None]
+    done = [r for r in results if r['status'] == 'done']
+    audio_seconds = sum(r['audio_seconds'] for r in done)
+    summary = {
+        'source': args.source,
+        'workers': args.workers,
+        'sample_rate': args.sample_rate,
+        'totals': {
+            'files': len(jobs),
+            'done': len(done),
+            'failed': sum(1 for r in results if r['status'] == 'error'),
+            'not_run': len(jobs) - len(results),
+            'audio_seconds': round(audio_seconds, 3),
+            'wall_seconds': round(wall, 3),
+            'rtf': round(wall / audio_seconds, 4) if audio_seconds else None,
+        },
+        'files': results,
+    }
+    if stage_metrics is not None:
+        summary['stages'] = stage_metrics.since(metrics_start)
+    summary_path = args.summary or os.path.join(output_dir, 'batch_summary.json')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    totals = summary['totals']
+    print(f"batch: {totals['done']}/{totals['files']} done, {totals['failed']} failed, "
+          f"{totals['audio_seconds']:.1f}s audio in {wall:.1f}s; summary in {summary_path}", file=sys.stderr)
+    return 0 if len(done) == len(jobs) else 1
+
+
+def parse_importtime(stderr_text: str, top: int = 15) -> list:
+    """Summarize `python -X importtime` output: slowest top-level imports by cumulative time."""
+    entries = []
+    for line in stderr_text.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        # Top-level imports have a single space of indentation
+        if match and len(match.group(3)) == 1:
+            entries.append({
+                'module': match.group(4),
+                'self_ms': int(match.group(1)) / 1000,
+                'cumulative_ms': int(match.group(2)) / 1000,
+            })
+    entries.sort(key=lambda e: e['cumulative_ms'], reverse=True)
+    return entries[:top]
+
+
+def run_startup_probe(args) -> int:
+    """Child side of the startup benchmark: time window creation and first audio, print JSON."""
+    launch = float(os.environ.get('LOCAL_TTS_LAUNCH_TIME', _MODULE_LOADED))
+    result = {'module_loaded': _MODULE_LOADED - launch}
+
+    try:
+        root = tk.Tk()
+        TTSApp(root)
+        root.update()
+        result['time_to_window'] = time.time() - launch
+        root.destroy()
+    except tk.TclError as e:
+        result['time_to_window'] = None
+        result['window_error'] = str(e)
+
+    if not args.no_audio:
+        try:
+            start = time.time()
+            load_engine()
+            result['engine_import'] = time.time() - start
+            init_device()
+            start = time.time()
+            pipeline = get_pipeline_for_lang('a')
+            result['pipeline_load'] = time.time() - start
+            for _, _, audio in pipeline(WARMUP_TEXT['a'], voice='af_heart', speed=1.0):
+                result['time_to_first_audio'] = time.time() - launch
+                break
+        except Exception as e:
+            result['audio_error'] = str(e)
+
+    print(json.dumps(result))
+    return 0
+
+
+def run_startup_benchmark(args) -> int:
+    """Launch cold app processes and report time-to-window, time-to-first-audio and import costs."""
+    import statistics
+    import subprocess
+
+    def probe(importtime=False):
+        cmd = [sys.executable] + (['-X', 'importtime'] if importtime else [])
+        cmd += [os.path.abspath(__file__), '--startup-probe'] + (['--no-audio'] if args.no_audio else [])
+        env = dict(os.environ, LOCAL_TTS_LAUNCH_TIME=repr(time.time()))
+        proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            raise RuntimeError(f'startup probe failed: {proc.stderr.strip()[-500:]}')
+        return json.loads(lines[-1]), proc.stderr
+
+    runs = [probe()[0] for _ in range(args.runs)]
+    report = {'runs': args.runs}
+    for key in ('module_loaded', 'time_to_window', 'engine_import', 'pipeline_load', 'time_to_first_audio'):
+        values = [r[key] for r in runs if r.get(key) is not None]
+        if values:
+            report[key] = round(statistics.median(values), 4)
+    for key in ('window_error', 'audio_error'):
+        if runs[-1].get(key):
+            report[key] = runs[-1][key]
+
+    # One extra run under -X importtime for the breakdown (its timings are inflated, so not used above)
+    _, importtime_log = probe(importtime=True)
+    report['imports'] = parse_importtime(importtime_log, args.top)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = [
+            key for key in ('time_to_window', 'time_to_first_audio')
+            if report.get(key) and baseline.get(key) and report[key] > baseline[key] * (1 + args.tolerance)
+        ]
+        if regressions:
+            print(f"Startup regression in: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+def run_resample_benchmark(args) -> int:
+    """Compare chunk-by-chunk stream resampling with resampling the whole file afterwards."""
+    import soxr
+    rng = np.random.default_rng(0)
+    chunk_frames = int(args.chunk_seconds * SAMPLE_RATE)
+    n_chunks = max(1, int(args.seconds / args.chunk_seconds))
+    # Speech-band test signal: a few drifting tones plus noise
+    t = np.arange(chunk_frames * n_chunks) / SAMPLE_RATE
+    signal = (0.3 * np.sin(2 * np.pi * (180 + 40 * np.sin(t)) * t)
+              + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+    chunks = np.split(signal, n_chunks)
+
+    report = {'audio_seconds': round(len(signal) / SAMPLE_RATE, 1), 'chunk_seconds': args.chunk_seconds,
+              'quality': args.quality, 'rates': {}}
+    for rate in args.rates:
+        start = time.perf_counter()
+        resampler = StreamResampler(SAMPLE_RATE, rate, args.quality)
+        streamed = [resampler.process(chunk) for chunk in chunks]
+        streamed.append(resampler.flush())
+        stream_seconds = time.perf_counter() - start
+        streamed = np.concatenate(streamed)
+
+        # What downstream consumers do today: collect everything, then resample once
+        start = time.perf_counter()
+        whole = soxr.resample(np.concatenate(chunks), SAMPLE_RATE, rate, quality=args.quality)
+        whole_seconds = time.perf_counter() - start
+
+        report['rates'][str(rate)] = {
+            'stream_seconds': round(stream_seconds, 4),
+            'whole_file_seconds': round(whole_seconds, 4),
+            'stream_x_realtime': round(report['audio_seconds'] / stream_seconds, 1),
+            'whole_file_x_realtime': round(report['audio_seconds'] / whole_seconds, 1),
+            # Seam check: streamed output should match the one-shot result
+            'max_abs_difference': float(np.max(np.abs(streamed - whole))) if len(streamed) == len(whole) else None,
+            'frames': [len(streamed), len(whole)],
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    return 0
+
+
+class _StubResult:
+    """Mimics kokoro's KPipeline.Result: attributes plus (graphemes, phonemes, audio) unpacking."""
+
+    def __init__(self, graphemes, phonemes, audio, text_index=None):
+        self.graphemes = graphemes
+        self.phonemes = phonemes
+        self.audio = audio
+        self.text_index = text_index
+
+    def __iter__(self):
+        return iter((self.graphemes, self.phonemes, self.audio))
+
+
+class StubPipeline:
+    """Deterministic stand-in for kokoro.KPipeline, for benchmarks without model weights.
+
+    "Phonemes" are the text's non-space characters; each yields
+    frames_per_phoneme / speed samples of a tone derived from the text and
+    voice, so the same input always gives the same audio. Every call costs
+    call_cost + phoneme_cost * len(phonemes) seconds (slept, like waiting on an
+    accelerator).
+    """
+
+    def __init__(self, lang_code='a', call_cost=0.005, phoneme_cost=0.001, frames_per_phoneme=1800):
+        self.lang_code = lang_code
+        self.call_cost = call_cost
+        self.phoneme_cost = phoneme_cost
+        self.frames_per_phoneme = frames_per_phoneme
+
+    def g2p(self, text):
+        return ''.join(text.split()), None
+
+    def _audio(self, phonemes, voice, speed):
+        time.sleep(self.call_cost + self.phoneme_cost * len(phonemes))
+        frames = int(len(phonemes) * self.frames_per_phoneme / speed)
+        seed = int(hashlib.sha256(f'{voice}|{phonemes}'.encode('utf-8')).hexdigest()[:8], 16)
+        t = np.arange(frames, dtype=np.float32) / SAMPLE_RATE
+        return (0.2 * np.sin(2 * np.pi * (110 + seed % 220) * t)).astype(np.float32)
+
+    def generate_from_tokens(self, tokens, voice=None, speed=1):
+        yield _StubResult(None, tokens, self._audio(tokens, voice, speed))
+
+    def __call__(self, text, voice=None, speed=1, split_pattern=r'\n+'):
+        pieces = text if isinstance(text, list) else (re.split(split_pattern, text) if split_pattern else [text])
+        for index, piece in enumerate(pieces):
+            phonemes = self.g2p(piece)[0]
+            if phonemes:
+                yield _StubResult(piece, phonemes, self._audio(phonemes, voice, speed), index)
+
+
+def kokoro_weights_available() -> bool:
+    """True when kokoro is installed and its model weights are already downloaded."""
+    try:
+        import importlib.util
+        if importlib.util.find_spec('kokoro') is None:
+            return False
+        from huggingface_hub import try_to_load_from_cache
+        return isinstance(try_to_load_from_cache('hexgrad/Kokoro-82M', 'kokoro-v1_0.pth'), str)
+    except Exception:
+        return False
+
+
+_BENCH_ARTICLE = """\
+The first lighthouses were little more than fires kept burning on hilltops near a harbour mouth. Sailors returning after dark steered for the glow, and the keepers who fed the flames through the night were paid by the ships that arrived safely. Over the centuries the fires moved into towers, and the towers moved out onto the rocks where the danger actually lay.
+
+Building on an exposed reef was a problem of a different order. Stone had to be quarried and shaped on land, numbered, shipped out in calm weather and fitted together in the short hours between tides. On some sites the masons could work for only a few days each summer. A single tower might take six or seven seasons, and more than one was swept away before it was finished.
+
+The light itself improved just as slowly. Candles gave way to oil lamps with polished reflectors, and reflectors gave way to the glass lenses designed by Augustin Fresnel in the eighteen twenties. A Fresnel lens bends the light from a single flame into a narrow, intense beam that can be seen more than twenty miles away. Rotating the lens turns the steady beam into a pattern of flashes, and every station was given a pattern of its own so that a navigator could tell one light from another.
+
+Keeping a light was lonely and exacting work. The lamp had to be trimmed, the lens cleaned and the clockwork wound at fixed hours. Logbooks recorded the weather, passing ships and every minute the light was late. Families lived in the tower or in a cottage at its foot, and children rowed across to the mainland for school when the sea allowed it.
+
+Electric lamps, radio beacons and finally satellite navigation made most of that work unnecessary. Today nearly every light is automatic, checked by a visiting technician a few times a year. Many of the old towers are museums or holiday cottages, but the lights in them still turn, and ships still count the flashes as they come in from the sea.
+"""
+
+# Fixed inputs for 'bench rtf': each corpus is a list of documents synthesized one after another
+BENCH_CORPORA = {
+    'short': [
+        'Your order has shipped.',
+        'Turn left at the next intersection.',
+        'The meeting starts in five minutes.',
+        'Battery low. Please connect the charger.',
+        'Thank you for calling. Please hold.',
+    ],
+    'long_en': ['\n\n'.join([_BENCH_ARTICLE] * 3)],
+    'mixed_bn_en': [
+        'আজকের আবহাওয়া খুব সুন্দর। The forecast says it will stay sunny all week. '
+        'আমরা বিকেলে পার্কে যাব। Bring a jacket in case it gets cold in the evening. '
+        'বাজার থেকে কিছু ফল কিনে আনতে হবে। We also need bread, milk and eggs for tomorrow.',
+    ],
+    'japanese': [
+        '今日はとても良い天気ですね。午後から公園へ散歩に行きましょう。'
+        '駅の近くに新しいパン屋さんができました。朝早くから開いているそうです。'
+        '来週の会議の資料を準備しておいてください。',
+    ],
+}
+
+
+def run_rtf_benchmark(args) -> int:
+    """Synthesize fixed corpora over a sweep of settings and report throughput as JSON."""
+    import itertools
+    import statistics
+    global pipeline_manager, g2p_cache
+
+    engine = args.engine
+    if engine == 'auto':
+        engine = 'kokoro' if kokoro_weights_available() else 'stub'
+    if engine == 'stub':
+        pipeline_manager = PipelineManager(lambda lang_code: StubPipeline(
+            lang_code, call_cost=args.stub_call_cost, phoneme_cost=args.stub_phoneme_cost))
+    else:
+        init_device()
+    # Every run should synthesize, not replay earlier results
+    g2p_cache = None
+
+    corpora = {name: BENCH_CORPORA[name] for name in args.corpora}
+    report = {
+        'engine': engine,
+        'config': {'pipelined_stages': PIPELINED_STAGES},
+        'runs': [],
+    }
+    if not PIPELINED_STAGES:
+        # Staged runs group chunks only for G2P cache passes, and the cache is off here
+        report['config']['batch_size'] = SYNTH_BATCH_SIZE
+    if engine == 'stub':
+        report['config']['stub_cost'] = {'call': args.stub_call_cost, 'phoneme': args.stub_phoneme_cost}
+
+    # Load every pipeline the corpora route to before timing anything
+    for documents, voice in itertools.product(corpora.values(), args.voices):
+        for chunk in chunk_text(documents[0])[:1]:
+            _, _, lang = prepare_chunk(chunk, voice)
+            get_pipeline_for_lang(lang)
+
+    for name, voice, speed, chunker, chunk_size in itertools.product(
+            corpora, args.voices, args.speeds, args.chunkers, args.chunk_sizes):
+        peak_rss = [get_rss_bytes()]
+        sampling = threading.Event()
+
+        def sample_rss():
+            while not sampling.wait(0.02):
+                peak_rss.append(get_rss_bytes())
+
+        sampler = threading.Thread(target=sample_rss, daemon=True)
+        sampler.start()
+        chunks = 0
+        audio_frames = 0
+        ttfa = []
+        start = time.perf_counter()
+        for document in corpora[name]:
+            text_chunks = chunk_text(document, chunker, max_words=chunk_size, max_tokens=chunk_size)
+            doc_start = time.perf_counter()
+            first = True
+            for _, audio in iter_chunk_audio(text_chunks, voice, speed, threading.Event(),
+                                             batch_size=SYNTH_BATCH_SIZE, staged=PIPELINED_STAGES):
+                if first:
+                    ttfa.append(time.perf_counter() - doc_start)
+                    first = False
+                chunks += 1
+                audio_frames += len(audio)
+        wall = time.perf_counter() - start
+        sampling.set()
+        sampler.join()
+
+        audio_seconds = audio_frames / SAMPLE_RATE
+        report['runs'].append({
+            'corpus': name,
+            'voice': voice,
+            'speed': speed,
+            'chunker': chunker,
+            'chunk_size': chunk_size,
+            'chunks': chunks,
+            'audio_seconds': round(audio_seconds, 2),
+            'wall_seconds': round(wall, 3),
+            'rtf': round(wall / audio_seconds, 4) if audio_seconds else None,
+            'time_to_first_audio': round(statistics.median(ttfa), 4) if ttfa else None,
+            'chunks_per_second': round(chunks / wall, 2) if wall else None,
+            'peak_rss_mb': round(max(peak_rss) / 1e6, 1),
+        })
+        print(f"{name:12s} {voice} x{speed} {chunker}/{chunk_size}: rtf {report['runs'][-1]['rtf']}", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    return 0
+
+
+def run_segment_benchmark(args) -> int:
+    """Compare one-pass script segmentation with detecting the language of every chunk."""
+    paragraphs = [p for docs in BENCH_CORPORA.values() for doc in docs for p in doc.split('\n\n') if p.strip()]
+    # Interleave the corpora into one large mixed-script document
+    parts, size = [], 0
+    while size < args.megabytes * 1e6:
+        for paragraph in paragraphs:
+            parts.append(paragraph)
+            size += len(paragraph.encode('utf-8')) + 2
+    document = '\n\n'.join(parts)
+    megabytes = len(document.encode('utf-8')) / 1e6
+
+    def best_of(fn):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    segment_seconds, runs = best_of(lambda: list(iter_script_runs(document)))
+    # What routing did before: fixed chunks, each scanned by detect_language_code
+    detect_seconds, chunks = best_of(lambda: [(detect_language_code(c), c)
+                                               for c in iter_word_chunks(document, args.chunk_words)])
+    mixed = sum(1 for _, chunk in chunks if len({m.lastgroup for m in _SCRIPT_RUN.finditer(chunk)}) > 1)
+
+    characters = {}
+    for lang, run in runs:
+        characters[lang] = characters.get(lang, 0) + len(run)
+    report = {
+        'megabytes': round(megabytes, 2),
+        'segment': {
+            'seconds': round(segment_seconds, 4),
+            'mb_per_second': round(megabytes / segment_seconds, 1),
+            'runs': len(runs),
+            'characters_by_lang': characters,
+        },
+        'detect_per_chunk': {
+            'seconds': round(detect_seconds, 4),
+            'mb_per_second': round(megabytes / detect_seconds, 1),
+            'chunks': len(chunks),
+            'chunk_words': args.chunk_words,
+            # Chunks routed to one pipeline although they contain more than one script
+            'mixed_script_chunks': mixed,
+        },
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
+    return 0
+
+
+def build_arg_parser():
+    import argparse
+    parser = argparse.ArgumentParser(description=f'{APP_NAME} - local text-to-speech with Kokoro.')
+    parser.add_argument('--startup-probe', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--no-audio', action='store_true', help=argparse.SUPPRESS)
+    commands = parser.add_subparsers(dest='command')
+
+    serve = commands.add_parser('serve', help='Run the local HTTP speech server (OpenAI-compatible)')
+    serve.add_argument('--host', default='127.0.0.1', help='interface to bind (default: localhost only)')
+    serve.add_argument('--port', type=int, default=8880)
+    serve.add_argument('--workers', type=int, default=2,
+                       help='requests handled in parallel; model calls on one language pipeline still run one at a time')
+    serve.add_argument('--queue-size', type=int, default=16, help='queued requests before answering 429')
+    serve.set_defaults(handler=run_server)
+
+    batch = commands.add_parser('batch', help='Render a directory or manifest of text files without the GUI')
+    batch.add_argument('source', help='directory of .txt files, or a JSON Lines manifest of '
+                                      '{"input", "output", "voice", "speed", "format"} objects')
+    batch.add_argument('-o', '--output-dir', default='batch_output', help='where outputs go unless an entry names one')
+    batch.add_argument('--voice', default='af_heart', help='default voice (code or name)')
+    batch.add_argument('--speed', type=float, default=1.0, help='default speed')
+    batch.add_argument('--format', default='wav', choices=list(RESPONSE_FORMATS), help='default output format')
+    batch.add_argument('--sample-rate', type=int, default=SAMPLE_RATE, help='output sample rate for every file')
+    batch.add_argument('--workers', type=int, default=2,
+                       help='files rendered at once (threads); without --processes they take turns in each language model')
+    batch.add_argument('--processes', type=int, default=PARALLEL_WORKERS,
+                       help='synthesis processes shared by all files, so inference runs in parallel '
+                            f'(default: PARALLEL_WORKERS = {PARALLEL_WORKERS}; 0 synthesizes in the --workers threads)')
+    batch.add_argument('--summary', help='JSON summary path (default: <output-dir>/batch_summary.json)')
+    batch.set_defaults(handler=run_batch)
+
+    bench = commands.add_parser('bench', help='Run a benchmark suite')
+    suites = bench.add_subparsers(dest='suite', required=True)
+
+    startup = suites.add_parser('startup', help='Cold-start time to window and to first audio')
+    startup.add_argument('--runs', type=int, default=3, help='cold starts to take the median of')
+    startup.add_argument('--no-audio', action='store_true', help='skip the first-audio measurement (no model weights)')
+    startup.add_argument('--top', type=int, default=15, help='number of slowest imports to list')
+    startup.add_argument('--output', help='also write the JSON report to this file')
+    startup.add_argument('--baseline', help='previous report; exit non-zero if startup got slower')
+    startup.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown vs. baseline (fraction)')
+    startup.set_defaults(handler=run_startup_benchmark)
+
+    resample = suites.add_parser('resample', help='Stream vs. whole-file resampling throughput')
+    resample.add_argument('--seconds', type=float, default=600, help='length of the test signal')
+    resample.add_argument('--chunk-seconds', type=float, default=5, help='chunk length fed to the stream resampler')
+    resample.add_argument('--rates', type=lambda v: [int(r) for r in v.split(',')], default=[16000, 8000],
+                          help='comma-separated target rates (default: 16000,8000)')
+    resample.add_argument('--quality', default=RESAMPLE_QUALITY, choices=['QQ', 'LQ', 'MQ', 'HQ', 'VHQ'])
+    resample.add_argument('--output', help='also write the JSON report to this file')
+    resample.set_defaults(handler=run_resample_benchmark)
+
+    def csv(cast):
+        return lambda value: [cast(v) for v in value.split(',')]
+
+    rtf = suites.add_parser('rtf', help='Real-time factor, time to first audio, chunks/s and peak RSS over fixed corpora')
+    rtf.add_argument('--engine', choices=['auto', 'kokoro', 'stub'], default='auto',
+                     help='auto: Kokoro if its weights are downloaded, else the deterministic stub')
+    rtf.add_argument('--corpora', type=csv(str), default=list(BENCH_CORPORA),
+                     help=f"comma-separated subset of: {', '.join(BENCH_CORPORA)}")
+    rtf.add_argument('--voices', type=csv(str), default=['af_heart'])
+    rtf.add_argument('--speeds', type=csv(float), default=[1.0])
+    rtf.add_argument('--chunkers', type=csv(str), default=[CHUNKER], help="'sentence' and/or 'words'")
+    rtf.add_argument('--chunk-sizes', type=csv(int), default=[CHUNK_TOKEN_BUDGET],
+                     help='token budget (sentence chunker) or words per chunk (words chunker)')
+    rtf.add_argument('--stub-call-cost', type=float, default=0.005, help='stub engine: seconds per call')
+    rtf.add_argument('--stub-phoneme-cost', type=float, default=0.001, help='stub engine: seconds per phoneme')
+    rtf.add_argument('--output', help='also write the JSON report to this file')
+    rtf.set_defaults(handler=run_rtf_benchmark)
+
+    segment = suites.add_parser('segment', help='Script segmentation vs. per-chunk language detection throughput')
+    segment.add_argument('--megabytes', type=float, default=5, help='size of the mixed-script test document')
+    segment.add_argument('--chunk-words', type=int, default=50, help='chunk size for the per-chunk detection baseline')
+    segment.add_argument('--repeat', type=int, default=3, help='runs to take the fastest of')
+    segment.add_argument('--output', help='also write the JSON report to this file')
+    segment.set_defaults(handler=run_segment_benchmark)
+
+    return parser
+
+
+# Wall-clock time at which this module finished importing (startup benchmark reference point)
+_MODULE_LOADED = time.time()
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.startup_probe:
+        sys.exit(run_startup_probe(args))
+    if args.command:
+        sys.exit(args.handler(args))
+
     root = tk.Tk()
     app = TTSApp(root)
     # insert a helpful default text
@@ -1207,4 +5307,5 @@ def main():
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,96 @@
+"""Chunk cache and G2P cache eviction."""
+
+import os
+
+import numpy as np
+
+from app import ChunkCache, G2PCache
+
+
+def noise(seed, frames=4800):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, frames).astype(np.float32)
+
+
+def make_chunk_cache(directory, entries):
+    """A cache whose budget fits `entries` chunks of noise(), measured with a probe entry."""
+    probe = ChunkCache(str(directory / 'probe'), 1 << 30)
+    probe._model_version = 'test'
+    probe.put('probe', noise(99))
+    size = os.path.getsize(probe._path('probe'))
+    cache = ChunkCache(str(directory / 'cache'), int(size * (entries + 0.5)))
+    cache._model_version = 'test'
+    return cache
+
+
+def test_chunk_cache_round_trip(tmp_path):
+    cache = make_chunk_cache(tmp_path, 4)
+    key = cache.key('Hello.', 'af_heart', 'a', 1.0)
+    audio = noise(0)
+    cache.put(key, audio)
+    np.testing.assert_allclose(cache.get(key), audio, atol=1 / 32768)
+    assert cache.get(cache.key('Hello.', 'af_heart', 'a', 1.1)) is None
+    assert cache.stats() == (1, 1)
+
+
+def test_chunk_cache_evicts_least_recently_used(tmp_path):
+    cache = make_chunk_cache(tmp_path, 2)
+    keys = [cache.key(f'Sentence {i}.', 'af_heart', 'a', 1.0) for i in range(3)]
+    cache.put(keys[0], noise(0))
+    cache.put(keys[1], noise(1))
+    assert cache.get(keys[0]) is not None  # keys[1] is now the oldest
+    cache.put(keys[2], noise(2))
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+    assert not os.path.exists(cache._path(keys[1]))
+
+
+def test_chunk_cache_keeps_an_entry_larger_than_the_budget(tmp_path):
+    cache = ChunkCache(str(tmp_path), 1)
+    cache._model_version = 'test'
+    cache.put('a' * 64, noise(0))
+    cache.put('b' * 64, noise(1))
+    assert cache.get('a' * 64) is None
+    assert cache.get('b' * 64) is not None
+
+
+class CountingPipeline:
+    """Stands in for a KPipeline: G2P uppercases the text and counts its calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def g2p(self, text):
+        self.calls.append(text)
+        return text.upper(), None
+
+
+def test_g2p_cache_converts_each_unit_once():
+    cache, pipeline = G2PCache(8), CountingPipeline()
+    assert cache.phonemize_many(pipeline, 'a', ['one', 'two', 'one']) == ['ONE', 'TWO', 'ONE']
+    assert cache.phonemize(pipeline, 'a', '  one ') == 'ONE'
+    assert pipeline.calls == ['one', 'two']
+    # The language is part of the key
+    cache.phonemize(pipeline, 'b', 'one')
+    assert pipeline.calls == ['one', 'two', 'one']
+
+
+def test_g2p_cache_evicts_least_recently_used():
+    cache, pipeline = G2PCache(2), CountingPipeline()
+    for unit in ('one', 'two', 'one', 'three'):
+        cache.phonemize(pipeline, 'a', unit)
+    pipeline.calls.clear()
+    cache.phonemize(pipeline, 'a', 'one')
+    assert pipeline.calls == []
+    cache.phonemize(pipeline, 'a', 'two')
+    assert pipeline.calls == ['two']
+
+
+def test_g2p_cache_store_outlives_the_memory_lru(tmp_path):
+    path = str(tmp_path / 'g2p.sqlite')
+    first, pipeline = G2PCache(1, path), CountingPipeline()
+    first.phonemize_many(pipeline, 'a', ['one', 'two'])
+    second = G2PCache(1, path)
+    assert second.phonemize_many(pipeline, 'a', ['one', 'two']) == ['ONE', 'TWO']
+    assert pipeline.calls == ['one', 'two']
+    assert second.stats()[:2] == (2, 0)
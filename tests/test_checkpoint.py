@@ -0,0 +1,76 @@
+"""JobCheckpoint round-trips."""
+
+import os
+
+import numpy as np
+
+from app import ChunkCache, JobCheckpoint, prepare_chunk
+
+TEXT = 'First chunk. Second chunk. Third chunk.'
+CHUNKS = ['First chunk.', 'Second chunk.', 'Third chunk.']
+VOICE = 'af_heart'
+
+
+def audio(seed):
+    return np.random.default_rng(seed).uniform(-0.5, 0.5, 2400).astype(np.float32)
+
+
+def reopen(tmp_path, cache=None, voice=VOICE, chunks=CHUNKS):
+    return JobCheckpoint(str(tmp_path / 'checkpoints'), TEXT, voice, 1.0, chunks, cache)
+
+
+def test_round_trip_without_the_chunk_cache(tmp_path):
+    checkpoint = reopen(tmp_path)
+    checkpoint.save(0, audio(0))
+    checkpoint.save(2, np.zeros(0, dtype=np.float32))
+    checkpoint.close()
+
+    resumed = reopen(tmp_path)
+    assert resumed.completed == {0: 'wav', 2: 'empty'}
+    np.testing.assert_array_equal(resumed.load(0), audio(0))
+    assert resumed.load(2).size == 0
+
+
+def test_round_trip_through_the_chunk_cache(tmp_path):
+    cache = ChunkCache(str(tmp_path / 'cache'), 1 << 30)
+    cache._model_version = 'test'
+    processed, chunk_voice, lang = prepare_chunk(CHUNKS[1], VOICE)
+    key = cache.key(processed, chunk_voice, lang, 1.0)
+    cache.put(key, audio(1))  # iter_chunk_audio stores the chunk before it is checkpointed
+    checkpoint = reopen(tmp_path, cache)
+    checkpoint.save(1, audio(1))
+    checkpoint.close()
+    assert not any(name.endswith('.wav') for name in os.listdir(checkpoint.directory))
+
+    resumed = reopen(tmp_path, cache)
+    assert resumed.completed == {1: key}
+    np.testing.assert_allclose(resumed.load(1), audio(1), atol=1 / 32768)
+
+    # A chunk the cache has evicted since has to be synthesized again
+    os.remove(cache._path(key))
+    assert reopen(tmp_path, cache).completed == {}
+
+
+def test_a_different_job_does_not_resume(tmp_path):
+    checkpoint = reopen(tmp_path)
+    checkpoint.save(0, audio(0))
+    checkpoint.close()
+    assert reopen(tmp_path, voice='am_adam').completed == {}
+    assert reopen(tmp_path, chunks=CHUNKS[:2]).completed == {}
+
+
+def test_a_torn_last_line_is_ignored(tmp_path):
+    checkpoint = reopen(tmp_path)
+    checkpoint.save(0, audio(0))
+    checkpoint.close()
+    with open(os.path.join(checkpoint.directory, 'completed.jsonl'), 'a', encoding='utf-8') as f:
+        f.write('{"chunk": 1, "sto')
+    assert reopen(tmp_path).completed == {0: 'wav'}
+
+
+def test_discard_removes_the_checkpoints(tmp_path):
+    checkpoint = reopen(tmp_path)
+    checkpoint.save(0, audio(0))
+    checkpoint.discard()
+    assert not os.path.exists(checkpoint.directory)
+    assert reopen(tmp_path).completed == {}
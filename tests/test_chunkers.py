@@ -0,0 +1,52 @@
+"""Sentence and word chunkers."""
+
+from app import TextRun, chunk_text, estimate_tokens, iter_chunks, iter_sentence_chunks, iter_word_chunks
+
+
+def test_word_chunks_hold_max_words_each():
+    assert list(iter_word_chunks('one two  three\nfour five', max_words=2)) == ['one two', 'three four', 'five']
+
+
+def test_word_chunker_ignores_paragraphs_and_scripts():
+    chunks = list(iter_chunks('One two.\n\nनमस्ते तीन', chunker='words', max_words=3))
+    assert chunks == ['One two. नमस्ते', 'तीन']
+    assert not any(isinstance(chunk, TextRun) for chunk in chunks)
+
+
+def test_sentence_chunks_pack_whole_sentences_within_the_budget():
+    sentences = [f'This is sentence number {word}.' for word in ('one', 'two', 'three', 'four', 'five')]
+    text = ' '.join(sentences)
+    chunks = list(iter_sentence_chunks(text, max_tokens=70))
+    assert ' '.join(chunks) == text
+    assert all(estimate_tokens(chunk) <= 70 for chunk in chunks)
+    assert all(chunk.endswith('.') for chunk in chunks)
+    assert 1 < len(chunks) < len(sentences)
+
+
+def test_oversized_sentence_is_split_on_words():
+    sentence = ' '.join(['word'] * 40) + '.'
+    chunks = list(iter_sentence_chunks(sentence, max_tokens=30))
+    assert ' '.join(chunks) == sentence
+    assert all(estimate_tokens(chunk) <= 30 for chunk in chunks)
+
+
+def test_sentence_chunks_never_span_paragraphs():
+    assert list(iter_sentence_chunks('First one.\n\nSecond one.', max_tokens=200)) == ['First one.', 'Second one.']
+
+
+def test_sentence_chunker_tags_language_and_sentence_ends():
+    chunks = list(iter_chunks('I said नमस्ते to them.', chunker='sentence'))
+    assert [chunk.lang for chunk in chunks] == ['a', 'hi', 'a']
+    assert [chunk.ends_sentence for chunk in chunks] == [False, False, True]
+
+
+def test_last_chunk_of_a_split_run_keeps_the_run_end():
+    text = ' '.join(['word'] * 40) + ' नमस्ते'
+    chunks = list(iter_chunks(text, chunker='sentence', max_tokens=30))
+    latin = [chunk for chunk in chunks if chunk.lang == 'a']
+    assert len(latin) > 1
+    assert not any(chunk.ends_sentence for chunk in latin)
+
+
+def test_chunk_text_falls_back_to_the_whole_text():
+    assert chunk_text('   ') == ['   ']
@@ -0,0 +1,50 @@
+"""Script-run segmentation (iter_script_runs)."""
+
+from app import TextRun, iter_script_runs
+
+
+def runs(text, cjk_lang=None):
+    return [(lang, str(run)) for lang, run in iter_script_runs(text, cjk_lang)]
+
+
+def test_runs_follow_script_changes_and_rebuild_the_paragraph():
+    text = 'Hello world. नमस्ते दुनिया। See you.'
+    result = runs(text)
+    assert [lang for lang, _ in result] == ['a', 'hi', 'a']
+    assert ''.join(run for _, run in result) == text
+
+
+def test_closing_punctuation_stays_on_the_run_it_ends():
+    assert runs('Hello world. नमस्ते दुनिया।') == [('a', 'Hello world.'), ('hi', ' नमस्ते दुनिया।')]
+
+
+def test_runs_never_span_paragraphs():
+    result = runs('One sentence.\n\nAnother one.')
+    assert [run.strip() for _, run in result] == ['One sentence.', 'Another one.']
+
+
+def test_digits_and_punctuation_only_go_to_english():
+    assert runs('123, 456!') == [('a', '123, 456!')]
+
+
+def test_kana_anywhere_in_the_paragraph_makes_kanji_japanese():
+    result = runs('日本語 (Japanese) の勉強。')
+    assert {lang for lang, _ in result if lang != 'a'} == {'ja'}
+
+
+def test_kanji_only_paragraph_takes_the_document_language():
+    assert runs('第一章\n\nこれは日本語です。')[0][0] == 'ja'
+    assert runs('第一章\n\n这是中文。')[0][0] == 'zh'
+
+
+def test_explicit_cjk_lang_labels_kanji_only_paragraphs():
+    assert runs('第一章', cjk_lang='ja') == [('ja', '第一章')]
+    # Kana in the paragraph itself still wins
+    assert runs('これは本です。', cjk_lang='zh')[0][0] == 'ja'
+
+
+def test_ends_sentence_marks_runs_that_stop_mid_sentence():
+    result = list(iter_script_runs('I said नमस्ते to them.'))
+    assert all(isinstance(run, TextRun) for _, run in result)
+    assert [run.ends_sentence for _, run in result] == [False, False, True]
+    assert [run.lang for _, run in result] == ['a', 'hi', 'a']
@@ -0,0 +1,62 @@
+"""HTTP request parsing in SpeechServer._read_request."""
+
+import asyncio
+
+import pytest
+
+from app import RequestError, SpeechServer
+
+
+def read(data):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await SpeechServer()._read_request(reader)
+    return asyncio.run(run())
+
+
+def request(headers='', body=b'', line='POST /v1/audio/speech?x=1 HTTP/1.1'):
+    return f'{line}\r\nHost: localhost\r\n{headers}\r\n'.encode('latin-1') + body
+
+
+def test_parses_method_path_headers_and_body():
+    body = b'{"input": "Hello"}'
+    method, path, headers, parsed = read(request(f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n',
+                                                 body))
+    assert (method, path, parsed) == ('POST', '/v1/audio/speech', body)
+    assert headers['content-type'] == 'application/json'
+
+
+def test_missing_content_length_means_no_body():
+    assert read(request(line='get /health HTTP/1.1')) == ('GET', '/health', {'host': 'localhost'}, b'')
+
+
+@pytest.mark.parametrize('length', ['abc', '-1', '1.5', '²', '0x10'])
+def test_invalid_content_length_is_a_bad_request(length):
+    with pytest.raises(RequestError) as error:
+        read(request(f'Content-Length: {length}\r\n'))
+    assert error.value.status == 400
+
+
+def test_oversize_body_is_rejected():
+    with pytest.raises(RequestError) as error:
+        read(request(f'Content-Length: {2 * 1024 * 1024}\r\n'))
+    assert error.value.status == 413
+
+
+def test_oversize_headers_are_rejected():
+    with pytest.raises(RequestError) as error:
+        read(request(f'X-Padding: {"a" * 70000}\r\n'))
+    assert error.value.status == 431
+
+
+def test_malformed_request_line_is_a_bad_request():
+    with pytest.raises(RequestError) as error:
+        read(request(line='GARBAGE'))
+    assert error.value.status == 400
+
+
+def test_truncated_body_raises_incomplete_read():
+    with pytest.raises(asyncio.IncompleteReadError):
+        read(request('Content-Length: 10\r\n', b'short'))